@@ -0,0 +1,231 @@
+import argparse
+import gzip
+import json
+import logging
+import random
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+SERIAL_PATH = "/api/prod/serialnumberinfo/get"
+WORKORDER_PATH = "/api/prod/labelworkorder/get"
+WO_PATH = "/api/prod/wo/get"
+
+SAMPLE_ZPL = "^XA^PW800^LL400^FO50,50^A0N,40,40^FD{serial}^FS^FO50,120^BY2^BCN,80,Y,N,N^FD{serial}^FS^XZ"
+
+
+class MockLabelApi:
+    """
+    Servidor HTTP local (somente biblioteca padrão) que substitui as APIs de produção
+    serialnumberinfo, labelworkorder e wo em testes e benchmarks fora da rede da fábrica.
+
+    As respostas são geradas (workorders, etiquetas com ZPL e imagens de tamanho configurável)
+    ou lidas de arquivos gravados no formato do workorder_cache.json / api1_cache.json.
+    Latência, jitter e taxa de erros (HTTP 503) são configuráveis.
+    """
+    def __init__(self, host="127.0.0.1", port=8080, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0,
+                 workorders=10, labels_per_workorder=100, image_bytes=0, line_code="AA1",
+                 workorder_cache_file=None, api1_cache_file=None, seed=None):
+        self.host = host
+        self.port = port
+        self.latency = latency_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self.error_rate = error_rate
+        self.workorders = workorders
+        self.labels_per_workorder = labels_per_workorder
+        self.image_bytes = image_bytes
+        self.line_code = line_code
+        self.random = random.Random(seed)
+        self.random_lock = threading.Lock()
+        # Contadores atualizados pelas threads do ThreadingHTTPServer
+        self.counters_lock = threading.Lock()
+        self.requests = {SERIAL_PATH: 0, WORKORDER_PATH: 0, WO_PATH: 0}
+        self.errors = 0
+        self.recorded_workorders = self._load_recorded(workorder_cache_file, "data")
+        self.recorded_serials = self._load_recorded(api1_cache_file, None)
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @staticmethod
+    def _load_recorded(file_path, data_key):
+        """
+        Lê um arquivo de cache gravado pelo LabelManager e retorna {workorder: resposta}.
+        """
+        if not file_path:
+            return {}
+        with open(file_path, mode="r", encoding="utf-8") as f:
+            entries = json.load(f)
+        recorded = {}
+        for entry in entries:
+            workorder = entry.get("workorder")
+            if not workorder:
+                continue
+            if data_key:
+                recorded[workorder] = entry.get(data_key)
+            else:
+                recorded[workorder] = [{"WorkOrderCode": entry.get("WorkOrderCode", workorder),
+                                        "ModelSuffix": entry.get("ModelSuffix", ""),
+                                        "ZPL": ""}]
+        return recorded
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.server.server_address[1]}"
+
+    def urls(self):
+        """
+        Retorna as URLs no formato das chaves do config.json (api_serial_url, api_workorder_url, api_wo_url).
+        """
+        return {
+            "api_serial_url": self.base_url + SERIAL_PATH,
+            "api_workorder_url": self.base_url + WORKORDER_PATH,
+            "api_wo_url": self.base_url + WO_PATH,
+        }
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        logging.info(f"API simulada ativa em {self.base_url}")
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def workorder_codes(self):
+        if self.recorded_workorders:
+            return list(self.recorded_workorders)
+        return [f"MOCK{index:04d}" for index in range(self.workorders)]
+
+    def wo_list(self, schedule_date):
+        return [
+            {
+                "WorkOrderCode": workorder_code,
+                "LineCode": self.line_code,
+                "StatusTypeDesc": "Released",
+                "ScheduleDate": schedule_date,
+            }
+            for workorder_code in self.workorder_codes()
+        ]
+
+    def workorder_labels(self, workorder_code):
+        if workorder_code in self.recorded_workorders:
+            return self.recorded_workorders[workorder_code]
+        image = "A" * self.image_bytes
+        labels = []
+        for sequence in range(1, self.labels_per_workorder + 1):
+            serial = f"{workorder_code}-{sequence:05d}"
+            labels.append({
+                "WorkOrderCode": workorder_code,
+                "SerialNo": serial,
+                "ZPL": SAMPLE_ZPL.format(serial=serial),
+                "Images": [image] if image else [],
+            })
+        return labels
+
+    def serial_info(self, serial_number):
+        workorder_code = serial_number.split("-")[0]
+        if workorder_code in self.recorded_serials:
+            return self.recorded_serials[workorder_code]
+        return [{"WorkOrderCode": workorder_code, "ModelSuffix": "MOCK.AWZ", "ZPL": ""}]
+
+    def _delay_and_fail(self):
+        """
+        Aplica a latência configurada e decide se a requisição deve falhar.
+        """
+        with self.random_lock:
+            delay = max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+            fail = self.random.random() < self.error_rate
+        if delay:
+            time.sleep(delay)
+        return fail
+
+    def _handler_class(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                logging.debug("API simulada: " + format, *args)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                params = dict(parse_qsl(url.query))
+                if url.path not in api.requests:
+                    self._send(404, {"error": "not found"})
+                    return
+                with api.counters_lock:
+                    api.requests[url.path] += 1
+                if api._delay_and_fail():
+                    with api.counters_lock:
+                        api.errors += 1
+                    self._send(503, {"error": "simulated failure"})
+                    return
+                if url.path == WO_PATH:
+                    body = api.wo_list(params.get("parameters.fromScheduleDate", datetime.now().strftime("%Y-%m-%d")))
+                elif url.path == WORKORDER_PATH:
+                    body = api.workorder_labels(params.get("parameters.workOrderCode", ""))
+                else:
+                    body = api.serial_info(params.get("parameters.serialNumber", ""))
+                self._send(200, body)
+
+            def _send(self, status, body):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                if "gzip" in self.headers.get("Accept-Encoding", ""):
+                    data = gzip.compress(data, compresslevel=1)
+                    self.send_header("Content-Encoding", "gzip")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Servidor local que simula as APIs de etiquetas (serialnumberinfo, labelworkorder e wo).")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency-ms", type=float, default=0, help="latência média de cada resposta")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="variação (+/-) da latência")
+    parser.add_argument("--error-rate", type=float, default=0, help="fração das requisições que retornam HTTP 503")
+    parser.add_argument("--workorders", type=int, default=10, help="quantidade de workorders geradas na API de WO")
+    parser.add_argument("--labels", type=int, default=100, help="etiquetas geradas por workorder")
+    parser.add_argument("--image-bytes", type=int, default=0, help="tamanho do campo Images de cada etiqueta")
+    parser.add_argument("--line-code", default="AA1")
+    parser.add_argument("--workorder-cache", default=None,
+                        help="workorder_cache.json gravado, usado como resposta da API de workorder")
+    parser.add_argument("--api1-cache", default=None,
+                        help="api1_cache.json gravado, usado como resposta da API de serial number")
+    parser.add_argument("--seed", type=int, default=None, help="semente para reprodutibilidade")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    api = MockLabelApi(host=args.host, port=args.port, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                       error_rate=args.error_rate, workorders=args.workorders, labels_per_workorder=args.labels,
+                       image_bytes=args.image_bytes, line_code=args.line_code,
+                       workorder_cache_file=args.workorder_cache, api1_cache_file=args.api1_cache, seed=args.seed)
+    print("Adicione ao config.json:")
+    print(json.dumps(api.urls(), indent=4))
+    try:
+        api.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        api.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+import argparse
+import hashlib
+import ipaddress
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from urllib.parse import urlparse
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import NewConnectionError, ConnectTimeoutError
+from urllib3.util.connection import allowed_gai_family
+
+from latency_stats import ms, percentile
+
+# Medições da requisição em andamento na thread atual (preenchidas pelas conexões instrumentadas)
+_local = threading.local()
+
+
+class _TimingMixin:
+    """
+    Mede, para a requisição em andamento na thread, a resolução de nome (DNS), o tempo
+    de conexão e o tempo até o primeiro byte da resposta (TTFB). Conexões reaproveitadas
+    do pool não passam por _new_conn, e por isso não registram DNS/conexão.
+
+    O nome é resolvido uma única vez, aqui, e a conexão usa os endereços obtidos (o urllib3
+    recebe o IP e não consulta o DNS novamente); assim o tempo de DNS gravado é o da
+    resolução que a requisição de fato usou.
+    """
+    def _new_conn(self):
+        timings = getattr(_local, "timings", None)
+        if timings is None:
+            return super()._new_conn()
+        host = self._dns_host.strip("[]")
+        try:
+            ipaddress.ip_address(host)
+        except ValueError:
+            started_at = time.perf_counter()
+            try:
+                addresses = socket.getaddrinfo(host, self.port, allowed_gai_family(), socket.SOCK_STREAM)
+            except socket.gaierror:
+                # O urllib3 gera o erro de resolução de nome correspondente
+                return super()._new_conn()
+            timings["dns_ms"] = ms(time.perf_counter() - started_at)
+        else:
+            addresses = None
+        connect_started_at = time.perf_counter()
+        if addresses:
+            sock = self._connect_resolved(addresses)
+        else:
+            sock = super()._new_conn()
+        timings["connect_ms"] = ms(time.perf_counter() - connect_started_at)
+        return sock
+
+    def _connect_resolved(self, addresses):
+        """
+        Conecta ao primeiro endereço resolvido que aceitar a conexão, na ordem do getaddrinfo
+        (como o urllib3 faria), pelo próprio _new_conn do urllib3.
+        """
+        dns_host = self._dns_host
+        error = None
+        try:
+            for address in addresses:
+                self._dns_host = address[4][0]
+                try:
+                    return super()._new_conn()
+                except (NewConnectionError, ConnectTimeoutError) as ex:
+                    error = ex
+        finally:
+            self._dns_host = dns_host
+        raise error
+
+    def request(self, *args, **kwargs):
+        timings = getattr(_local, "timings", None)
+        if timings is not None:
+            timings["_sent_at"] = time.perf_counter()
+        return super().request(*args, **kwargs)
+
+    def getresponse(self, *args, **kwargs):
+        response = super().getresponse(*args, **kwargs)
+        timings = getattr(_local, "timings", None)
+        if timings is not None and "_sent_at" in timings:
+            timings["ttfb_ms"] = ms(time.perf_counter() - timings["_sent_at"])
+        return response
+
+
+class _TimedHTTPConnection(_TimingMixin, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimingMixin, HTTPSConnection):
+    pass
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter cujas conexões registram as medições de DNS, conexão e TTFB usadas pelo ApiRecorder.
+    """
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
+
+
+class RequestRecord:
+    """
+    Dados de uma requisição acompanhada pelo ApiRecorder.track().
+    """
+    def __init__(self, url, params):
+        self.url = url
+        self.params = params
+        self.response = None
+
+    def set_response(self, response):
+        self.response = response
+
+
+class ApiRecorder:
+    """
+    Gravador opcional das requisições às APIs: acrescenta uma linha JSON compacta por requisição
+    (endpoint, hash dos parâmetros, status, bytes, tempos de DNS/conexão/TTFB/total e número de
+    novas tentativas) e rotaciona o arquivo ao atingir 'max_bytes', mantendo 'backups' arquivos antigos.
+
+    Desativado, track() apenas executa o bloco, sem medições nem escrita.
+    """
+    def __init__(self, file_path="requests.jsonl", enabled=False, max_bytes=10 * 1024 * 1024, backups=3):
+        self.file_path = file_path
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def params_hash(params):
+        canonical = json.dumps(params or {}, sort_keys=True, default=str)
+        return hashlib.sha1(canonical.encode("utf-8")).hexdigest()[:12]
+
+    @contextmanager
+    def track(self, url, params=None):
+        """
+        Acompanha uma requisição feita dentro do bloco 'with'. O bloco deve chamar
+        record.set_response(response) para que status, bytes e novas tentativas sejam gravados.
+        """
+        record = RequestRecord(url, params)
+        if not self.enabled:
+            yield record
+            return
+        _local.timings = {}
+        started_at = time.perf_counter()
+        error = None
+        try:
+            yield record
+        except BaseException as ex:
+            error = type(ex).__name__
+            raise
+        finally:
+            total = time.perf_counter() - started_at
+            timings = _local.timings
+            _local.timings = None
+            try:
+                self._write(self._entry(record, timings, total, error))
+            except Exception as ex:
+                logging.error(f"Erro ao gravar requisição em {self.file_path}: {ex}")
+
+    def _entry(self, record, timings, total, error):
+        now = datetime.now()
+        response = record.response
+        status = retries = size = None
+        if response is not None:
+            status = response.status_code
+            raw = getattr(response, "raw", None)
+            if raw is not None:
+                history = getattr(getattr(raw, "retries", None), "history", None)
+                retries = len(history) if history is not None else None
+                try:
+                    size = raw.tell()
+                except Exception:
+                    size = None
+        return {
+            "ts": now.isoformat(timespec="milliseconds"),
+            "hour": now.hour,
+            "endpoint": urlparse(record.url).path,
+            "params_hash": self.params_hash(record.params),
+            "status": status,
+            "bytes": size,
+            "dns_ms": timings.get("dns_ms"),
+            "connect_ms": timings.get("connect_ms"),
+            "ttfb_ms": timings.get("ttfb_ms"),
+            "total_ms": ms(total),
+            "retries": retries,
+            "error": error,
+        }
+
+    def _write(self, entry):
+        line = json.dumps(entry, separators=(",", ":")) + "\n"
+        with self.lock:
+            try:
+                if os.path.getsize(self.file_path) + len(line) > self.max_bytes:
+                    self._rotate()
+            except OSError:
+                pass
+            with open(self.file_path, mode="a", encoding="utf-8") as f:
+                f.write(line)
+
+    def _rotate(self):
+        for index in range(self.backups - 1, 0, -1):
+            source = f"{self.file_path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.file_path}.{index + 1}")
+        if self.backups > 0:
+            os.replace(self.file_path, f"{self.file_path}.1")
+        else:
+            os.remove(self.file_path)
+
+
+def load_records(file_path, backups=3):
+    """
+    Lê as linhas gravadas (incluindo arquivos rotacionados), ignorando linhas corrompidas.
+    """
+    paths = [f"{file_path}.{index}" for index in range(backups, 0, -1)] + [file_path]
+    records = []
+    for path in paths:
+        if not os.path.isfile(path):
+            continue
+        with open(path, mode="r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if isinstance(entry, dict) and "endpoint" in entry and "total_ms" in entry:
+                    records.append(entry)
+    return records
+
+
+def summarize(records):
+    """
+    Agrupa as requisições por (endpoint, hora do dia) e calcula quantidade, erros e p50/p95/p99 do tempo total.
+    """
+    groups = {}
+    for entry in records:
+        groups.setdefault((entry["endpoint"], entry.get("hour")), []).append(entry)
+    summary = []
+    for (endpoint, hour), entries in sorted(groups.items(), key=lambda item: (item[0][0], item[0][1] if item[0][1] is not None else -1)):
+        totals = sorted(entry["total_ms"] for entry in entries)
+        errors = sum(1 for entry in entries
+                     if entry.get("error") or (entry.get("status") is not None and entry["status"] >= 400))
+        summary.append({
+            "endpoint": endpoint,
+            "hour": hour,
+            "count": len(entries),
+            "errors": errors,
+            "retries": sum(entry.get("retries") or 0 for entry in entries),
+            "p50_ms": percentile(totals, 50),
+            "p95_ms": percentile(totals, 95),
+            "p99_ms": percentile(totals, 99),
+        })
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Análise das requisições gravadas pelo ApiRecorder.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    summarize_parser = subparsers.add_parser("summarize", help="latência p50/p95/p99 por endpoint e hora do dia")
+    summarize_parser.add_argument("file", nargs="?", default="requests.jsonl")
+    summarize_parser.add_argument("--backups", type=int, default=3, help="quantidade de arquivos rotacionados a incluir")
+    args = parser.parse_args()
+
+    rows = summarize(load_records(args.file, args.backups))
+    if not rows:
+        print("Nenhuma requisição gravada.")
+        return
+    print(f"{'endpoint':<40} {'hora':>4} {'qtde':>6} {'erros':>6} {'retries':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for row in rows:
+        hour = "-" if row["hour"] is None else f"{row['hour']:02d}"
+        print(f"{row['endpoint']:<40} {hour:>4} {row['count']:>6} {row['errors']:>6} {row['retries']:>7} "
+              f"{row['p50_ms']:>9} {row['p95_ms']:>9} {row['p99_ms']:>9}")
+
+
+if __name__ == "__main__":
+    main()
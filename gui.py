@@ -8,17 +8,15 @@ from tkinter.scrolledtext import ScrolledText
 import logging
 import csv
 import re
+import queue
 
 # Importa a classe LabelManager e a função resource_path definidas em main_top
 from main import LabelManager, resource_path
+from pipeline import StageFull
 import modbusclient
-from importlib import reload
-# Limpa o cache de configuração antes de recarregar o módulo
-modbusclient._modbus_config = None
-modbusclient._last_config_time = 0
-reload(modbusclient)
 
 # Forçar a recarga das configurações
+modbusclient.invalidate_modbus_config()
 modbusclient.load_modbus_config()
 
 # ---------------------------------------------------------------------------
@@ -120,6 +118,7 @@ class LabelManagerGUI(tk.Tk):
         self.printer_tooltip = None
         self.scanner_tooltip = None
         self.scanner2_tooltip = None  # NOVO: Tooltip para o scanner2
+        self.api_tooltip = None
 
         # Define o diretório atual e seta o cwd
         current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -170,6 +169,14 @@ class LabelManagerGUI(tk.Tk):
                 scanner_baud_rate2=scanner_baud_rate2
             )
 
+        # Seriais entregues ao pipeline e ainda em processamento. Acima de scan_max_pending, novas
+        # leituras são rejeitadas; com a política "coalesce", a releitura de um serial pendente é
+        # agrupada à leitura em andamento em vez de gerar um novo processamento.
+        self.scan_max_pending = max(1, int(self.config_data.get("scan_max_pending", 16)))
+        self.scan_overload_policy = self.config_data.get("scan_overload_policy", "coalesce")
+        self.pending_scans = {}
+        self.pending_scan_count = 0
+
         # Atributos para indicar se as conexões com os scanners foram estabelecidas com sucesso.
         self.scanner_connected = False
         self.scanner2_connected = False  # NOVO: Status de conexão do scanner2
@@ -193,6 +200,7 @@ class LabelManagerGUI(tk.Tk):
         self.start_scanner_listener()
         self.start_scanner2_listener()  # NOVO: Inicia o listener do scanner2
         self.auto_refresh_tables()
+        self.check_printer_wait()
         self.start_modbus_monitor_thread()
         self.start_modbus_monitoring()
 
@@ -286,6 +294,16 @@ class LabelManagerGUI(tk.Tk):
         self.scanner2_circle = self.scanner2_canvas.create_oval(2, 2, 18, 18, fill=initial_scanner2_color)
         self.scanner2_canvas.bind("<Enter>", self.show_scanner2_tooltip)
         self.scanner2_canvas.bind("<Leave>", self.hide_scanner2_tooltip)
+
+        # Indicador da API (vermelho = modo offline, servindo etiquetas a partir do cache)
+        api_label = ttk.Label(indicator_frame, text="API: ")
+        api_label.grid(row=0, column=6, sticky="w")
+        self.api_canvas = tk.Canvas(indicator_frame, width=20, height=20, bd=0, highlightthickness=0)
+        self.api_canvas.grid(row=0, column=7, padx=(0,20))
+        initial_api_color = "green" if self.label_manager.api_online else "red"
+        self.api_circle = self.api_canvas.create_oval(2, 2, 18, 18, fill=initial_api_color)
+        self.api_canvas.bind("<Enter>", self.show_api_tooltip)
+        self.api_canvas.bind("<Leave>", self.hide_api_tooltip)
         
         # Atualiza periodicamente os indicadores de conexão
         self.update_connection_indicators()
@@ -390,6 +408,37 @@ class LabelManagerGUI(tk.Tk):
 
         self.refresh_summary_table()
 
+        # -------------------------------------------------------------------------------------
+        # Métricas Modbus (latência por operação/endereço, timeouts, erros e reconexões)
+        # -------------------------------------------------------------------------------------
+        metrics_frame = ttk.Frame(self.dashboard_tab, padding=(10, 0))
+        metrics_frame.pack(side="top", fill="x")
+
+        metrics_header = ttk.Frame(metrics_frame)
+        metrics_header.pack(fill="x")
+        metrics_label = ttk.Label(metrics_header, text="Métricas Modbus", style="Header.TLabel")
+        metrics_label.pack(side="left", pady=(0, 5))
+        self.modbus_metrics_status = ttk.Label(metrics_header, text="")
+        self.modbus_metrics_status.pack(side="left", padx=15)
+        # Estado da imagem dos registradores usada pelos alertas ("sem dados" quando desatualizada)
+        self.modbus_image_status = ttk.Label(metrics_header, text="Registradores: sem dados", foreground="red")
+        self.modbus_image_status.pack(side="left", padx=15)
+
+        metrics_columns = ("Operação", "Endereço", "Qtde", "Erros", "Timeouts",
+                           "p50 (ms)", "p95 (ms)", "p99 (ms)", "Máx (ms)")
+        self.modbus_metrics_tree = ttk.Treeview(
+            metrics_frame,
+            columns=metrics_columns,
+            show="headings",
+            height=4
+        )
+        for col in metrics_columns:
+            self.modbus_metrics_tree.heading(col, text=col)
+            self.modbus_metrics_tree.column(col, anchor="center", width=90, minwidth=70)
+        self.modbus_metrics_tree.pack(fill="x")
+
+        self.refresh_modbus_metrics()
+
         # -------------------------------------------------------------------------------------
         # Painel de Logs
         # -------------------------------------------------------------------------------------
@@ -871,13 +920,8 @@ class LabelManagerGUI(tk.Tk):
             self.current_theme = new_theme
             self.tk.call("set_theme", self.current_theme)
 
-        # Exemplo de recarregar o modbusclient (caso seu código já possua isso)
-        import modbusclient
-        from importlib import reload
-        # Limpa o cache de configuração antes de recarregar
-        if hasattr(modbusclient, "_modbus_config"):
-            modbusclient._modbus_config = None
-        reload(modbusclient)
+        # Invalida o cache de configuração do Modbus para que os novos valores sejam usados
+        modbusclient.invalidate_modbus_config()
 
         self.restart_modbus_monitor()
 
@@ -916,21 +960,80 @@ class LabelManagerGUI(tk.Tk):
         #     return
 
         self.process_status.config(text="Processando...")
-        threading.Thread(
-            target=self.process_serial_thread,
-            args=(serial_number,),
-            daemon=True
-        ).start()
-
-    def process_serial_thread(self, serial_number):
+        # Para input manual, permite reimprimir mesmo que o serial já tenha sido processado.
+        self.submit_serial(serial_number, allow_duplicate=True)
+
+    def submit_serial(self, serial_number, allow_duplicate=False):
+        """
+        Entrega o serial ao pipeline do LabelManager sem bloquear a interface.
+        Retorna o Future do processamento, ou None se a leitura foi rejeitada por sobrecarga.
+        Deve ser chamado na thread da interface.
+        """
+        key = (serial_number, allow_duplicate)
+        pending = self.pending_scans.get(key)
+        if pending is not None and self.scan_overload_policy == "coalesce":
+            logging.info(f"Serial {serial_number} já está em processamento; leitura agrupada.")
+            return pending
+        if self.pending_scan_count >= self.scan_max_pending:
+            return self._reject_serial(serial_number, f"{self.pending_scan_count} seriais pendentes")
+        try:
+            future = self.label_manager.process_serial(serial_number, allow_duplicate=allow_duplicate, block=False)
+        except queue.Full:
+            return self._reject_serial(serial_number, "fila do pipeline cheia")
+        self.pending_scans[key] = future
+        self.pending_scan_count += 1
+        future.add_done_callback(lambda f: self.after(0, self.on_serial_done, key, f))
+        return future
+
+    def _reject_serial(self, serial_number, reason):
+        logging.warning(f"Leitura do serial {serial_number} descartada: {reason}.")
+        self.process_status.config(text=f"Sistema ocupado: serial {serial_number} descartado.")
+        return None
+
+    def on_serial_done(self, key, future):
+        """
+        Atualiza a interface ao final do processamento de um serial (executado na thread da interface).
+        """
+        serial_number = key[0]
+        self.pending_scan_count -= 1
+        if self.pending_scans.get(key) is future:
+            del self.pending_scans[key]
         try:
-            # Para input manual, permite reimprimir mesmo que o serial já tenha sido processado.
-            self.label_manager.process_serial(serial_number, allow_duplicate=True)
-            self.after(0, self.process_status.config, {"text": f"Serial {serial_number} processada."})
-            self.after(0, self.refresh_summary_table)
-            self.after(0, self.refresh_history_table)
+            job = future.result()
+            status = job.get("status")
+        except StageFull:
+            self.process_status.config(text=f"Sistema ocupado: serial {serial_number} descartado.")
+            return
         except Exception as e:
-            self.after(0, self.process_status.config, {"text": f"Erro: {str(e)}"})
+            self.process_status.config(text=f"Erro: {str(e)}")
+            return
+        messages = {
+            "printed": f"Serial {serial_number} processada.",
+            "duplicate": f"Serial {serial_number} já impresso anteriormente.",
+            "invalid": f"Serial {serial_number} inválido.",
+            "lookup_failed": f"Falha ao obter os dados da workorder do serial {serial_number}.",
+            "no_record": f"Registro do serial {serial_number} não encontrado na workorder.",
+            "print_failed": f"Impressão do serial {serial_number} não confirmada.",
+        }
+        message = messages.get(status, f"Serial {serial_number} processada.")
+        if job.get("persist_error"):
+            message = f"Serial {serial_number} impresso, mas houve erro ao registrar: {job['persist_error']}"
+        self.process_status.config(text=message)
+        self.refresh_summary_table()
+        self.refresh_history_table()
+
+    def check_printer_wait(self):
+        """
+        A cada 2 segundos, alerta o operador se o estágio de impressão está aguardando a
+        impressora há mais de printer_not_ready_alert_s (as etiquetas continuam na fila).
+        """
+        waited = self.label_manager.printer_not_ready_for()
+        if waited is not None:
+            pending = self.label_manager.get_pipeline_stats()["print"]["depth"] + 1
+            self.process_status.config(
+                text=f"Impressora não pronta há {int(waited)} s: {pending} etiqueta(s) aguardando impressão.")
+            self.show_printer_error_alert()
+        self.after(2000, self.check_printer_wait)
 
     def auto_refresh_tables(self):
         """
@@ -966,7 +1069,7 @@ class LabelManagerGUI(tk.Tk):
                 print("Erro ao ler arquivo de seriais impressos:", e)
 
         workorders = set(self.label_manager.workorder_cache.keys())
-        for sn in self.label_manager.printed_serials:
+        for sn in self.label_manager.get_printed_serials_snapshot():
             wo = self.label_manager.get_workorder_from_serial(sn)
             if wo:
                 workorders.add(wo)
@@ -1065,6 +1168,7 @@ class LabelManagerGUI(tk.Tk):
         self.printer_canvas.itemconfig(self.printer_circle, fill=printer_color)
         self.scanner_canvas.itemconfig(self.scanner_circle, fill=scanner_color)
         self.scanner2_canvas.itemconfig(self.scanner2_circle, fill=scanner2_color)  # NOVO: Atualiza cor do scanner 2
+        self.api_canvas.itemconfig(self.api_circle, fill="green" if self.label_manager.api_online else "red")
         self.after(5000, self.update_connection_indicators)
 
     def show_printer_tooltip(self, event):
@@ -1135,6 +1239,34 @@ class LabelManagerGUI(tk.Tk):
             relief="solid"
         ).pack(ipadx=5, ipady=2)
 
+    def show_api_tooltip(self, event):
+        """
+        Exibe um tooltip com o status da API (online ou offline usando o cache).
+        """
+        status = "Online" if self.label_manager.api_online else "Offline (usando dados em cache)"
+        x = event.x_root + 10
+        y = event.y_root + 10
+        self.api_tooltip = tk.Toplevel(self.api_canvas)
+        self.api_tooltip.wm_overrideredirect(True)
+        self.api_tooltip.wm_geometry(f"+{x}+{y}")
+        bg_color = self.api_canvas.cget("bg")
+        tk.Label(
+            self.api_tooltip,
+            text=f"API: {status}",
+            bg=bg_color,
+            font=("Helvetica", 10),
+            borderwidth=1,
+            relief="solid"
+        ).pack(ipadx=5, ipady=2)
+
+    def hide_api_tooltip(self, event):
+        """
+        Remove o tooltip da API.
+        """
+        if self.api_tooltip:
+            self.api_tooltip.destroy()
+            self.api_tooltip = None
+
     def hide_scanner_tooltip(self, event):
         """
         Remove o tooltip do scanner.
@@ -1216,7 +1348,7 @@ class LabelManagerGUI(tk.Tk):
                     while not self.scanner_stop_event.is_set():
                         barcode_bytes = scanner.readline()
                         barcode = barcode_bytes.decode().strip() if barcode_bytes else ""
-                        if barcode:
+                        if barcode and self.label_manager.accept_scan(barcode):
                             self.after(0, self.process_scanned_barcode, barcode)
             except Exception as e:
                 self.scanner_connected = False
@@ -1238,7 +1370,7 @@ class LabelManagerGUI(tk.Tk):
                     while not self.scanner2_stop_event.is_set():
                         barcode_bytes = scanner.readline()
                         barcode = barcode_bytes.decode().strip() if barcode_bytes else ""
-                        if barcode:
+                        if barcode and self.label_manager.accept_scan(barcode):
                             self.after(0, self.process_scanned_barcode, barcode)
             except Exception as e:
                 self.scanner2_connected = False
@@ -1246,44 +1378,12 @@ class LabelManagerGUI(tk.Tk):
                 # Aguarda um curto período antes de tentar reconectar
                 self.scanner2_stop_event.wait(2)
     
-    def start_modbus_monitoring(self):
-        """
-        Inicia o monitoramento dos endereços Modbus em uma thread separada.
-        """
-        # Importa o módulo modbus e threading
-        from modbusclient import monitor_modbus_input
-        import threading
-        
-        # Inicia o monitoramento em uma thread separada
-        self.modbus_monitor_thread = threading.Thread(
-            target=monitor_modbus_input,
-            kwargs={
-                'address_to_monitor': 1,
-                'address_to_write': 2,
-                'address_read_confirmation': 3
-            },
-            daemon=True
-        )
-        self.modbus_monitor_thread.start()
-        logging.info("Monitoramento Modbus iniciado nos endereços 1, 2 e 3.")
-
     def process_scanned_barcode(self, barcode):
         """
         Atualiza a aba do scanner e processa o código lido.
         """
         self.scanner_status_label.config(text=f"Código lido: {barcode}")
-        threading.Thread(target=self.process_scanned_barcode_thread, args=(barcode,), daemon=True).start()
-
-    def process_scanned_barcode_thread(self, barcode):
-        try:
-            self.label_manager.process_serial(barcode)
-            # Atualiza o label de status para mostrar o processamento do serial
-            self.after(0, self.process_status.config, {"text": f"Serial {barcode} processada."})
-            self.after(0, self.refresh_summary_table)
-            self.after(0, self.refresh_history_table)
-        except Exception as e:
-            print("Erro ao processar barcode:", e)
-            self.after(0, self.process_status.config, {"text": f"Erro: {str(e)}"})
+        self.submit_serial(barcode)
 
     def download_history_csv(self):
         """
@@ -1336,32 +1436,77 @@ class LabelManagerGUI(tk.Tk):
     def start_modbus_monitoring(self):
         """
         Monitora os registradores Modbus para detectar erros e exibir alertas.
-        Verifica periodicamente o status da impressora e do scanner via Modbus.
+        Assina os eventos de mudança do poller de registradores (que faz as leituras em
+        segundo plano) e, a cada 2 segundos, reavalia a imagem em memória para reexibir
+        alertas que continuem ativos. Nenhuma leitura de rede é feita na thread da interface.
+        """
+        poller = modbusclient.get_register_poller()
+        poller.subscribe(self.on_modbus_registers_changed)
+        poller.start()
+        self.check_modbus_alerts()
+
+    def on_modbus_registers_changed(self, changes, values, detected_at):
+        """
+        Callback do poller (executado na thread do poller): repassa a imagem para a interface.
+        """
+        self.after(0, self.show_modbus_alerts, values)
+
+    def check_modbus_alerts(self):
+        """
+        Reavalia os alertas a partir da imagem atual dos registradores (sem acesso à rede).
+        Se o poller não atualizar a imagem dentro de modbus_alert_max_age_ms, ela é tratada
+        como ausente ("sem dados") em vez de exibir estados antigos como atuais.
         """
+        max_age = self.config_data.get("modbus_alert_max_age_ms", 1000) / 1000.0
+        self.show_modbus_alerts(modbusclient.get_register_poller().get_values(max_age=max_age))
+        # Agenda a próxima verificação para daqui a 2 segundos
+        self.after(2000, self.check_modbus_alerts)
+
+    def refresh_modbus_metrics(self):
+        """
+        Atualiza o painel de métricas Modbus a cada 2 segundos (apenas leitura de memória).
+        """
+        metrics = modbusclient.get_modbus_metrics()
+        for item in self.modbus_metrics_tree.get_children():
+            self.modbus_metrics_tree.delete(item)
+        for op in metrics["operations"]:
+            self.modbus_metrics_tree.insert("", "end", values=(
+                op["operation"], op["address"], op["count"], op["errors"], op["timeouts"],
+                op["p50_ms"], op["p95_ms"], op["p99_ms"], op["max_ms"]
+            ))
+        monitor = modbusclient.get_monitor_stats()
+        breakers = ", ".join(metrics["breakers"].values()) or "-"
+        self.modbus_metrics_status.config(text=(
+            f"Circuito: {breakers}  |  Rejeitadas: {metrics['rejected']}  |  "
+            f"Timeouts: {metrics['timeouts']}  |  Erros: {metrics['errors']}  |  "
+            f"Reconexões: {metrics['reconnects']}  |  Jitter p99: {monitor.get('jitter_p99_ms')} ms"
+        ))
+        self.after(2000, self.refresh_modbus_metrics)
+
+    def show_modbus_alerts(self, values):
+        """
+        Exibe os alertas da impressora e do scanner conforme os valores dos registradores.
+        values None indica imagem ausente ou desatualizada: nenhum alerta é avaliado.
+        """
+        if values is None:
+            self.modbus_image_status.config(text="Registradores: sem dados", foreground="red")
+            return
+        self.modbus_image_status.config(text="Registradores: atualizados", foreground="green")
         try:
             # Carrega os endereços dos registradores Modbus a partir da configuração
             modbus_address = self.config_data.get("modbus_address", 0)
             modbus_address_to_write = self.config_data.get("modbus_address_to_write", 6)
             
-            # Lê o valor dos registradores
-            from modbusclient import read_modbus_register_silent
-            
-            printer_status = read_modbus_register_silent(modbus_address)
-            scanner_status = read_modbus_register_silent(modbus_address_to_write)
-            
             # Verifica se há erro na impressora (valor 1 no endereço da impressora)
-            if printer_status == 1:
+            if values.get(modbus_address) == 1:
                 self.show_printer_error_alert()
             
             # Verifica se há erro no scanner (valor 1 no endereço do scanner)
-            if scanner_status == 1:
+            if values.get(modbus_address_to_write) == 1:
                 self.show_scanner_error_alert()
                 
         except Exception as e:
             logging.error(f"Erro ao monitorar registradores Modbus: {e}")
-        
-        # Agenda a próxima verificação para daqui a 2 segundos
-        self.after(2000, self.start_modbus_monitoring)
     
     def show_printer_error_alert(self):
         """
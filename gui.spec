@@ -5,8 +5,8 @@ a = Analysis(
     ['gui.py'],
     pathex=[],
     binaries=[],
-    datas=[('config.json', '.'), ('azure.tcl', '.'), ('workorder_cache.json', '.'), ('printed_serials.json', '.'), ('impressoes.csv', '.'), ('api1_cache.json', '.'), ('theme', 'theme'), ('app.log', '.')],
-    hiddenimports=['modbusclient', 'label_convert'],
+    datas=[('config.json', '.'), ('azure.tcl', '.'), ('workorder_cache.json', '.'), ('printed_serials.json', '.'), ('impressoes.csv', '.'), ('api1_cache.json', '.'), ('theme', 'theme')],
+    hiddenimports=['modbusclient', 'label_convert', 'print_job_log', 'api_recorder', 'pipeline', 'latency_stats'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
@@ -0,0 +1,27 @@
+def percentile(sorted_values, percent):
+    """
+    Retorna o percentil (0-100) de uma lista já ordenada, ou None se ela estiver vazia.
+    Usado pelas métricas de latência do Modbus, do pipeline e do gravador de requisições.
+    """
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(percent / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def ms(seconds):
+    """
+    Converte segundos em milissegundos (3 casas decimais); None permanece None.
+    """
+    return None if seconds is None else round(seconds * 1000.0, 3)
+
+
+def window_summary(prefix, samples, percents=(50, 99)):
+    """
+    Resume uma janela de amostras em segundos (ex.: cópia de um deque limitado, em qualquer
+    ordem): retorna {'<prefix>_p50_ms', '<prefix>_p99_ms', ..., '<prefix>_max_ms'}.
+    """
+    values = sorted(samples)
+    summary = {f"{prefix}_p{percent}_ms": ms(percentile(values, percent)) for percent in percents}
+    summary[f"{prefix}_max_ms"] = ms(values[-1]) if values else None
+    return summary
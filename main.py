@@ -4,14 +4,22 @@ import csv
 import re
 import logging
 import time
-from datetime import datetime
-from typing import Any, Dict, Tuple, Set
+import hashlib
+import codecs
+from datetime import datetime, timedelta
+from typing import Any, Dict, FrozenSet, Iterable, Iterator, List, Optional, Tuple, Set
 import serial
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from label_convert import process_zpl
-from modbusclient import write_modbus_register
+from modbusclient import write_modbus_register_async, write_modbus_register_address_async
+from print_job_log import PrintJobLog, JOB_SENT, JOB_CONFIRMED, JOB_FAILED, LABEL_API1, LABEL_WORKORDER
+from api_recorder import ApiRecorder, TimedHTTPAdapter
+from pipeline import Pipeline
+from latency_stats import ms
 import threading
-from queue import Queue
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 
 class ExcludeDynamicWorkOrderLogFilter(logging.Filter):
     """
@@ -38,6 +46,12 @@ console_handler.setFormatter(formatter)
 logger.addHandler(console_handler)
 
 
+# Endereços padrão das APIs de produção (podem ser sobrescritos no config.json)
+DEFAULT_API_SERIAL_URL = "http://150.150.251.243:3000/api/prod/serialnumberinfo/get"
+DEFAULT_API_WORKORDER_URL = "http://150.150.251.243:3000/api/prod/labelworkorder/get"
+DEFAULT_API_WO_URL = "http://150.150.251.243:3000/api/prod/wo/get"
+
+
 def resource_path(relative_path: str) -> str:
     """
     Retorna o caminho absoluto para um recurso, seja ele executado como script
@@ -51,12 +65,323 @@ def resource_path(relative_path: str) -> str:
     return os.path.join(base_path, relative_path)
 
 
-def configure_session_with_retries():
+class TokenBucket:
+    """
+    Limitador de taxa (token bucket) thread-safe: permite rajadas de até 'capacity'
+    requisições e, em regime, no máximo 'rate' requisições por segundo.
+    Uma taxa ausente (None) ou <= 0 desativa o limite.
+    """
+    def __init__(self, rate: float, capacity: float = None) -> None:
+        self.rate = float(rate) if rate is not None else 0.0
+        self.unlimited = self.rate <= 0
+        # Capacidade abaixo de 1 nunca acumularia um token inteiro
+        self.capacity = max(1.0, float(capacity if capacity is not None else self.rate))
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """
+        Bloqueia até que um token esteja disponível e o consome.
+        """
+        if self.unlimited:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class InstrumentedLock:
+    """
+    Lock (não reentrante) que mede o tempo de espera para obtê-lo e o tempo em que fica retido.
+    As estatísticas são atualizadas enquanto o lock está retido, sem sincronização adicional.
+    """
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.lock = threading.Lock()
+        self.acquisitions = 0
+        self.contended = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.hold_total = 0.0
+        self.hold_max = 0.0
+        self.acquired_at = 0.0
+
+    def __enter__(self) -> "InstrumentedLock":
+        started_at = time.perf_counter()
+        contended = not self.lock.acquire(blocking=False)
+        if contended:
+            self.lock.acquire()
+        self.acquired_at = time.perf_counter()
+        wait = self.acquired_at - started_at
+        self.acquisitions += 1
+        self.contended += contended
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        hold = time.perf_counter() - self.acquired_at
+        self.hold_total += hold
+        self.hold_max = max(self.hold_max, hold)
+        self.lock.release()
+
+    def stats(self) -> Dict[str, Any]:
+        acquisitions = self.acquisitions or 1
+        return {
+            "acquisitions": self.acquisitions,
+            "contended": self.contended,
+            "wait_avg_ms": ms(self.wait_total / acquisitions),
+            "wait_max_ms": ms(self.wait_max),
+            "hold_avg_ms": ms(self.hold_total / acquisitions),
+            "hold_max_ms": ms(self.hold_max),
+        }
+
+
+class BarcodeDebouncer:
+    """
+    Descarta leituras repetidas do mesmo código de barras dentro de uma janela de tempo,
+    compartilhada por todos os scanners (ex.: os dois scanners lendo a mesma unidade, ou o
+    gatilho mantido pressionado). A janela é renovada a cada leitura repetida, de modo que
+    disparos contínuos do mesmo código não geram novos processamentos.
+
+    Mapa com TTL (código -> instante da última leitura); entradas expiradas são removidas
+    periodicamente. Uma janela <= 0 desativa o filtro.
+    """
+    def __init__(self, window: float) -> None:
+        self.window = window
+        self.lock = threading.Lock()
+        self.last_seen: Dict[str, float] = {}
+        self.dropped = 0
+        self.next_purge = 0.0
+
+    def accept(self, barcode: str) -> bool:
+        """
+        Retorna True se a leitura deve ser processada, ou False se repete uma leitura recente.
+        """
+        if self.window <= 0:
+            return True
+        now = time.monotonic()
+        with self.lock:
+            if now >= self.next_purge:
+                self.last_seen = {code: seen for code, seen in self.last_seen.items()
+                                  if now - seen < self.window}
+                self.next_purge = now + self.window
+            seen = self.last_seen.get(barcode)
+            self.last_seen[barcode] = now
+            if seen is not None and now - seen < self.window:
+                self.dropped += 1
+                return False
+            return True
+
+
+class SingleFlight:
+    """
+    Agrupa chamadas concorrentes com a mesma chave: a primeira thread executa a função
+    e as demais aguardam e recebem o mesmo resultado (ou a mesma exceção).
+
+    Chamadas aninhadas devem usar chaves de espaços distintos (ex.: ("workorder", código)
+    e ("http", url, parâmetros)), pois uma thread que aguardasse a própria chave ficaria bloqueada.
+    """
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.calls: Dict[Any, Future] = {}
+        self.coalesced = 0
+
+    def do(self, key: Any, func, *args, **kwargs) -> Any:
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = Future()
+                self.calls[key] = call
+            else:
+                self.coalesced += 1
+        if not leader:
+            return call.result()
+        try:
+            result = func(*args, **kwargs)
+            call.set_result(result)
+            return result
+        except BaseException as ex:
+            call.set_exception(ex)
+            raise
+        finally:
+            with self.lock:
+                self.calls.pop(key, None)
+
+
+# Caracteres que delimitam a estrutura de um elemento JSON (fora de strings) e o fim de uma string
+_JSON_STRUCTURAL = re.compile(r'[\[\]{}"]')
+_JSON_STRING_SPECIAL = re.compile(r'["\\]')
+_JSON_SCALAR_END = re.compile(r'[,\]\s]')
+
+
+def _scan_json_element(buffer: str, state: List[Any]) -> Optional[int]:
+    """
+    Procura o fim do elemento JSON (objeto, array, string ou escalar) que começa em state[0],
+    retomando a partir do ponto já examinado. 'state' é [início, posição examinada, profundidade,
+    dentro de string] e é atualizado quando o elemento ainda não terminou.
+
+    Retorna a posição logo após o elemento, ou None se ele continua no próximo bloco.
+    """
+    start, scan, depth, in_string = state
+    if buffer[start] not in '[{"':
+        # Escalar (número, true, false, null): termina no primeiro delimitador
+        match = _JSON_SCALAR_END.search(buffer, scan)
+        if match is None:
+            state[1] = len(buffer)
+            return None
+        return match.start()
+    while True:
+        if in_string:
+            match = _JSON_STRING_SPECIAL.search(buffer, scan)
+            if match is None:
+                scan = len(buffer)
+                break
+            if match.group() == "\\":
+                if match.end() >= len(buffer):
+                    # O caractere escapado ainda não chegou
+                    scan = match.start()
+                    break
+                scan = match.end() + 1
+                continue
+            in_string = False
+            scan = match.end()
+            if depth == 0:
+                return scan
+        else:
+            match = _JSON_STRUCTURAL.search(buffer, scan)
+            if match is None:
+                scan = len(buffer)
+                break
+            char = match.group()
+            scan = match.end()
+            if char == '"':
+                in_string = True
+            elif char in "[{":
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return scan
+    state[1:] = [scan, depth, in_string]
+    return None
+
+
+def iter_json_array(chunks: Iterable[bytes]) -> Iterator[Any]:
+    """
+    Interpreta de forma incremental um array JSON recebido em blocos de bytes (UTF-8),
+    retornando cada elemento assim que ele termina de chegar. Apenas o elemento em
+    construção fica no buffer, nunca a resposta inteira.
+
+    O fim de um elemento incompleto é procurado apenas no trecho que chegou desde a última
+    tentativa, e o elemento só é decodificado depois de completo: um registro grande dividido
+    em muitos blocos custa tempo linear no seu tamanho.
+
+    Lança ValueError se o conteúdo não for um array JSON válido ou estiver truncado.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    pos = 0
+    started = False
+    final = False
+    state = None
+    chunks = iter(chunks)
+    while True:
+        try:
+            text = utf8.decode(next(chunks))
+        except StopIteration:
+            text = utf8.decode(b"", final=True)
+            final = True
+        if pos:
+            buffer = buffer[pos:]
+            if state is not None:
+                state[0] -= pos
+                state[1] -= pos
+            pos = 0
+        buffer += text
+        while True:
+            if state is None:
+                while pos < len(buffer) and buffer[pos] in " \t\r\n":
+                    pos += 1
+                if pos >= len(buffer):
+                    break
+                if not started:
+                    if buffer[pos] != "[":
+                        raise ValueError("A resposta não é um array JSON.")
+                    started = True
+                    pos += 1
+                    continue
+                if buffer[pos] == ",":
+                    pos += 1
+                    continue
+                if buffer[pos] == "]":
+                    return
+                state = [pos, pos, 0, False]
+            if _scan_json_element(buffer, state) is None:
+                # Elemento incompleto: aguarda o próximo bloco
+                break
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError as ex:
+                raise ValueError(f"Elemento JSON inválido: {ex}") from None
+            yield item
+            pos = end
+            state = None
+        if final:
+            raise ValueError("Array JSON truncado.")
+
+
+def configure_session_with_retries(pool_maxsize: int = 10,
+                                   max_retries: int = 3,
+                                   backoff_factor: float = 0.5,
+                                   backoff_jitter: float = 0.3,
+                                   backoff_max: float = 10.0,
+                                   adapter_class: type = HTTPAdapter) -> requests.Session:
+    """
+    Cria a sessão HTTP compartilhada pelas consultas às APIs.
+
+    - Pool de conexões keep-alive dimensionado para as threads que consultam as APIs;
+    - Novas tentativas apenas para GET, em falhas de conexão/leitura e nos status 429/500/502/503/504,
+      com backoff exponencial com jitter (limitado a 'backoff_max') e respeitando o cabeçalho Retry-After;
+    - 'adapter_class' permite usar o TimedHTTPAdapter, que mede DNS/conexão/TTFB para o ApiRecorder.
+    """
+    retry_options = dict(
+        total=max_retries,
+        connect=max_retries,
+        read=max_retries,
+        status=max_retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(["GET"]),
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    try:
+        retry = Retry(backoff_jitter=backoff_jitter, backoff_max=backoff_max, **retry_options)
+    except TypeError:
+        # urllib3 1.x não possui backoff_jitter/backoff_max
+        retry = Retry(**retry_options)
+    adapter = adapter_class(pool_connections=4, pool_maxsize=pool_maxsize, max_retries=retry)
     session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
     return session
 
 
 class LabelManager:
+    # Intervalo mínimo entre tentativas de revalidação da mesma entrada de cache durante uma queda da API
+    REVALIDATION_RETRY_S = 30
+
     # Imagem padrão (ZPL) para pré-carga na impressora.
     STANDARD_IMAGE_ZPL = """~DG13006430,3286,31,\r\n0000"""
     
@@ -69,13 +394,21 @@ class LabelManager:
              scanner_baud_rate2: int = 9600,  # Baud rate para o segundo scanner
              csv_file: str = None,
              org_code: str = 'NW7',
-             api_serial_url: str = "http://150.150.251.243:3000/api/prod/serialnumberinfo/get",
-             api_workorder_url: str = "http://150.150.251.243:3000/api/prod/labelworkorder/get") -> None:
+             api_serial_url: str = None,
+             api_workorder_url: str = None,
+             api_wo_url: str = None) -> None:
     
-        # Inicializa os locks antes de qualquer operação
-        self.lock_file = threading.Lock()
-        self.lock_csv = threading.Lock()
-        self.lock_printed_serials = threading.Lock()
+        # Inicializa os locks antes de qualquer operação. Cada arquivo tem seu próprio lock, e os
+        # caches em memória têm locks apenas para os escritores: leitores usam a referência atual
+        # (snapshot imutável, substituído por cópia na escrita) e nunca aguardam uma gravação em disco.
+        # A exceção é printed_serials, que cresce a cada etiqueta: é um set alterado sob o lock.
+        self.lock_workorder_file = InstrumentedLock("workorder_cache.json")
+        self.lock_api1_file = InstrumentedLock("api1_cache.json")
+        self.lock_printed_serials_file = InstrumentedLock("printed_serials.json")
+        self.lock_csv = InstrumentedLock("csv")
+        self.lock_workorder_cache = InstrumentedLock("workorder_cache")
+        self.lock_api1_cache = InstrumentedLock("api1_cache")
+        self.lock_printed_serials = InstrumentedLock("printed_serials")
         # Carrega dados de configuração a partir do arquivo config.json
         config_path = resource_path("config.json")
         if os.path.exists(config_path):
@@ -109,6 +442,14 @@ class LabelManager:
         modbus_address_to_write = config.get("modbus_address_to_write", 2)
         modbus_address_read_confirmation = config.get("modbus_address_read_confirmation", 3)
 
+        # URLs das APIs (parâmetro do construtor > config.json > servidor de produção)
+        if api_serial_url is None:
+            api_serial_url = config.get("api_serial_url", DEFAULT_API_SERIAL_URL)
+        if api_workorder_url is None:
+            api_workorder_url = config.get("api_workorder_url", DEFAULT_API_WORKORDER_URL)
+        if api_wo_url is None:
+            api_wo_url = config.get("api_wo_url", DEFAULT_API_WO_URL)
+
         # Caso não exista caminho CSV informado, use um arquivo CSV padrão
         if csv_file is None:
             csv_file = "impressoes.csv"
@@ -122,6 +463,39 @@ class LabelManager:
 
         self.label_type_for_workorder = config.get("label_type_for_workorder")
 
+        # Concorrência e limite de taxa das consultas às APIs durante o pré-carregamento
+        self.api_max_workers = max(1, int(config.get("api_max_workers", 4)))
+        self.api_rate_limiter = TokenBucket(config.get("api_rate_per_second", 5),
+                                            config.get("api_burst", None))
+        # Timeouts (conexão, leitura) e política de novas tentativas da sessão HTTP
+        self.api_timeout = (config.get("api_connect_timeout_s", 3.05), config.get("api_read_timeout_s", 15))
+        self.api_max_retries = config.get("api_max_retries", 3)
+        self.api_backoff_factor = config.get("api_backoff_factor", 0.5)
+        # Intervalo do refresh do cache de workorders em segundo plano (0 desativa)
+        self.workorder_refresh_interval = config.get("workorder_refresh_interval_s", 300)
+        # Janela de antecipação (horas à frente de agora), linhas atendidas e orçamento de memória do cache
+        self.workorder_prefetch_hours = config.get("workorder_prefetch_hours", 12)
+        self.workorder_line_codes = set(config.get("workorder_line_codes", ["AA1"]))
+        self.workorder_cache_max_bytes = int(config.get("workorder_cache_max_mb", 256) * 1024 * 1024)
+        # Atraso para agrupar as gravações do workorder_cache.json em uma única regravação
+        self.workorder_cache_write_delay = config.get("workorder_cache_write_delay_ms", 1000) / 1000.0
+        # Threads para consultas às APIs feitas em paralelo durante o processamento de um serial
+        self.lookup_executor = ThreadPoolExecutor(max_workers=self.api_max_workers, thread_name_prefix="api-lookup")
+        # Consultas idênticas simultâneas (ex.: dois scanners lendo a mesma workorder nova) compartilham uma única requisição
+        self.single_flight = SingleFlight()
+        # Política de cache (stale-while-revalidate): dados com menos de cache_fresh_ttl_s são usados
+        # diretamente; até cache_max_stale_s são usados imediatamente e revalidados em segundo plano;
+        # acima disso exigem uma nova consulta à API.
+        self.cache_fresh_ttl = config.get("cache_fresh_ttl_s", 600)
+        self.cache_max_stale = config.get("cache_max_stale_s", 86400)
+        # Leituras repetidas do mesmo código (qualquer scanner) dentro desta janela são descartadas
+        self.scan_debouncer = BarcodeDebouncer(config.get("scan_dedup_window_ms", 1000) / 1000.0)
+        # Capacidade da fila de cada estágio do pipeline de processamento dos seriais
+        self.pipeline_queue_size = max(1, int(config.get("pipeline_queue_size", 32)))
+        # Tempo com a impressora não pronta a partir do qual o operador é alertado (o job continua aguardando)
+        self.printer_not_ready_alert = config.get("printer_not_ready_alert_s", 60)
+        self.printer_not_ready_since: Optional[float] = None
+
         # Atribuindo finalmente para nosso objeto
         self.serial_port = serial_port
         self.scanner_port = scanner_port
@@ -139,83 +513,237 @@ class LabelManager:
         self.org_code = org_code
         self.api_serial_url = api_serial_url
         self.api_workorder_url = api_workorder_url
-        self.session = configure_session_with_retries()
+        self.api_wo_url = api_wo_url
+        # Gravação opcional de cada requisição às APIs (tempos, status, bytes) para análise de latência
+        self.api_recorder = ApiRecorder(
+            resource_path(config.get("api_recorder_path", "requests.jsonl")),
+            enabled=config.get("api_recorder_enabled", False),
+            max_bytes=int(config.get("api_recorder_max_mb", 10) * 1024 * 1024)
+        )
+        # Pool dimensionado para os workers do estágio 'lookup', as consultas paralelas e as revalidações
+        self.session = configure_session_with_retries(
+            pool_maxsize=2 * self.api_max_workers + 4,
+            max_retries=self.api_max_retries,
+            backoff_factor=self.api_backoff_factor,
+            adapter_class=TimedHTTPAdapter if self.api_recorder.enabled else HTTPAdapter
+        )
 
         # Caches em memória
         self.workorder_cache: Dict[str, Any] = {}
         self.workorder_count: Dict[str, int] = {}
+        # Escrito apenas sob lock_printed_serials; quem itera usa get_printed_serials_snapshot()
         self.printed_serials: Set[str] = set()
         self.api1_cache: Dict[str, Tuple[str, str]] = {}
         self.images_printed: Set[str] = set()
+        self.workorder_fingerprints: Dict[str, str] = {}
+        self.workorder_schedule_day: Dict[str, int] = {}
+        # Tamanho estimado de cada workorder em cache; alterado apenas sob lock_workorder_cache
+        self.workorder_sizes: Dict[str, int] = {}
+        # Workorders gravadas desde a última remoção por orçamento (preservadas na próxima)
+        self.workorder_recently_stored: Set[str] = set()
+        self.workorder_cache_dirty = threading.Event()
+        # Instante (epoch) em que os dados de cada workorder / entrada do cache API1 foram obtidos da API
+        self.workorder_fetched_at: Dict[str, float] = {}
+        self.api1_fetched_at: Dict[str, float] = {}
+        # Indica se a última consulta às APIs teve sucesso (False = modo offline, servindo o cache)
+        self.api_online = True
+        self.revalidation_lock = threading.Lock()
+        self.revalidation_attempts: Dict[Any, float] = {}
 
         # Caminhos para arquivos de cache
         self.api1_cache_file = resource_path("api1_cache.json")
         self.workorder_cache_file = resource_path("workorder_cache.json")
         self.printed_serials_file = resource_path("printed_serials.json")
-
-        # Pré-carrega do dia as workorders na API de WO e grava no workorder_cache.json
-        self.preload_workorder_cache_from_daily_api()
+        self.print_job_log = PrintJobLog(resource_path("print_jobs.log"),
+                                         compact_after=config.get("print_log_compact_after", 500))
+        self.file_locks = {
+            self.workorder_cache_file: self.lock_workorder_file,
+            self.api1_cache_file: self.lock_api1_file,
+            self.printed_serials_file: self.lock_printed_serials_file,
+        }
 
         # Carrega caches (se existirem)
         self._load_api1_cache()
         self._load_workorder_cache()
         self._load_printed_serials()
 
+        # Pré-carrega do dia as workorders na API de WO; o gravador em segundo plano regrava o
+        # workorder_cache.json a partir do cache em memória (já contendo o que havia no arquivo)
+        self._start_workorder_cache_writer()
+        self.preload_workorder_cache_from_daily_api()
+
         # Pré-carrega imagem padrão na impressora
         self._preload_standard_image()
 
-        # Inicializa fila de impressão e locks para acesso thread-safe
-        self.print_queue = Queue()
-        self.lock_file = threading.Lock()
-        self.lock_csv = threading.Lock()
-        self.lock_printed_serials = threading.Lock()
-        self._start_print_worker()
+        # Inicializa o pipeline de processamento (e impressão)
+        self.pipeline = self._build_pipeline()
+        self._recover_print_jobs()
+        self._start_workorder_refresher()
 
-    def _start_print_worker(self) -> None:
-        """Inicia a thread que fica responsável por processar os jobs de impressão."""
-        self.print_worker = threading.Thread(target=self._print_worker, daemon=True)
-        self.print_worker.start()
+    def _build_pipeline(self) -> Pipeline:
+        """
+        Monta e inicia o pipeline de processamento dos seriais:
+        validate -> lookup -> render -> print -> persist.
 
-    def _print_worker(self) -> None:
+        Cada estágio tem seus próprios workers e uma fila limitada (pipeline_queue_size); quando
+        um estágio fica para trás, os anteriores aguardam (contrapressão) em vez de acumular jobs.
+        Seriais cuja workorder já está em cache seguem de validate direto para render, sem
+        esperar na fila das consultas às APIs. A exceção é o estágio 'lookup': com a fila cheia
+        (API lenta ou fora do ar), novos seriais que precisam das APIs são descartados (StageFull)
+        para que o worker de validate não fique bloqueado e os acertos de cache continuem fluindo.
         """
-        Worker de impressão: fica em loop aguardando jobs na fila.
-        Cada job deve conter (no mínimo) o comando ZPL, dados do registro e informações do serial.
-        Ao enviar o comando para a impressora, o worker aguarda a confirmação e registra os dados.
+        pipeline = Pipeline("scan")
+        pipeline.add_stage("validate", self._stage_validate, maxsize=self.pipeline_queue_size)
+        pipeline.add_stage("lookup", self._stage_lookup, workers=self.api_max_workers,
+                           maxsize=self.pipeline_queue_size, reject_when_full=True)
+        pipeline.add_stage("render", self._stage_render, maxsize=self.pipeline_queue_size)
+        # Um único worker de impressão: a impressora é um recurso serial
+        pipeline.add_stage("print", self._stage_print, maxsize=self.pipeline_queue_size)
+        pipeline.add_stage("persist", self._stage_persist, maxsize=self.pipeline_queue_size)
+        pipeline.start()
+        return pipeline
+
+    def get_pipeline_stats(self) -> Dict[str, Dict[str, Any]]:
         """
-        while True:
-            job = self.print_queue.get()
-            if job is None:
-                break
-            try:
-                if not self.is_printer_ready():
-                    logging.warning("A impressora não está pronta para impressão. Re-enfileirando o job.")
-                    self.print_queue.put(job)
-                    time.sleep(1)
-                    continue
-                logging.info("Enviando comando ZPL para impressão (job enfileirado).")
-                with serial.Serial(self.serial_port, self.baud_rate, timeout=2) as printer:
-                    printer.write(job["zpl"].encode())
-                    printer.flush()
-                time.sleep(0.5)  # Aguarda brevemente para assegurar o envio completo
-                if self._check_printing_status():
-                    logging.info("Impressão confirmada para serial: %s", job["serial_number"])
-                    serial_no = job["registro"].get("SerialNo", "")
-                    with self.lock_csv:
-                        self.save_to_csv(job["serial_number"],
-                                         job["workorder_code_api1"],
-                                         job["model_suffix_api1"],
-                                         serial_no)
-                    with self.lock_printed_serials:
-                        self.printed_serials.add(job["serial_number"])
-                        self._append_printed_serial(job["serial_number"],
-                                                    job["model_suffix_api1"],
-                                                    serial_no)
-                else:
-                    logging.warning("A impressão não foi confirmada para serial: %s", job["serial_number"])
-            except Exception as e:
-                logging.error("Erro no worker de impressão: %s", e)
-            finally:
-                self.print_queue.task_done()
+        Retorna, por estágio do pipeline, a profundidade da fila e os tempos de espera e de serviço.
+        """
+        return self.pipeline.stats()
+
+    def get_lock_stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Retorna, por lock, a quantidade de aquisições, as disputas e os tempos de espera e de posse.
+        """
+        locks = (self.lock_workorder_file, self.lock_api1_file, self.lock_printed_serials_file, self.lock_csv,
+                 self.lock_workorder_cache, self.lock_api1_cache, self.lock_printed_serials)
+        return {lock.name: lock.stats() for lock in locks}
+
+    def _recover_print_jobs(self) -> None:
+        """
+        Re-enfileira os jobs de impressão que não foram confirmados antes do último encerramento.
+        O log é lido (e compactado) aqui, antes de novos jobs serem registrados; a entrega ao
+        estágio 'print' é feita em segundo plano, pois a fila limitada pode bloquear enquanto
+        a impressora estiver indisponível.
+        """
+        jobs = self.print_job_log.recover_pending(self.printed_serials)
+        if jobs:
+            threading.Thread(target=self._resubmit_print_jobs, args=(jobs,),
+                             name="print-recovery", daemon=True).start()
+
+    def _resubmit_print_jobs(self, jobs: List[Dict[str, Any]]) -> None:
+        for job in jobs:
+            logging.info("Re-enfileirando job recuperado para serial: %s", job.get("serial_number"))
+            self.pipeline.submit({"serial_number": job.get("serial_number"), "print_jobs": [job]}, stage="print")
+
+    def _stage_print(self, job: Dict[str, Any]) -> Optional[str]:
+        """
+        Estágio 'print': envia à impressora, em ordem, as etiquetas do job (a da primeira API,
+        se houver, e a da workorder) e aguarda a confirmação de cada uma.
+        Enquanto a impressora não estiver pronta, o job aguarda neste estágio e a fila limitada
+        segura os estágios anteriores.
+        """
+        next_stage = None
+        for print_job in job["print_jobs"]:
+            if not self._print_job(print_job):
+                if print_job.get("label", LABEL_WORKORDER) == LABEL_WORKORDER:
+                    job["status"] = "print_failed"
+                continue
+            # A impressão física é registrada no log já aqui, independentemente do CSV/JSON
+            # gravados pelo estágio 'persist', para que o job não seja reimpresso após um reinício
+            self.print_job_log.record_state(print_job["id"], JOB_CONFIRMED)
+            if print_job.get("label", LABEL_WORKORDER) != LABEL_WORKORDER:
+                continue
+            # Marca em memória já aqui, para que uma nova leitura do mesmo serial seja
+            # tratada como duplicada enquanto o registro em disco ainda está na fila
+            with self.lock_printed_serials:
+                self.printed_serials.add(print_job["serial_number"])
+            job["print_job"] = print_job
+            job["status"] = "printed"
+            next_stage = "persist"
+        return next_stage
+
+    def _print_job(self, print_job: Dict[str, Any]) -> bool:
+        """
+        Envia o ZPL de um job à impressora e verifica o status. Retorna True se a impressão
+        foi confirmada; caso contrário, registra o job como falho no log de impressão.
+        """
+        try:
+            if not self.is_printer_ready():
+                self._wait_for_printer(print_job)
+            logging.info("Enviando comando ZPL para impressão (job enfileirado).")
+            self.print_job_log.record_state(print_job["id"], JOB_SENT)
+            with serial.Serial(self.serial_port, self.baud_rate, timeout=2) as printer:
+                printer.write(print_job["zpl"].encode())
+                printer.flush()
+            time.sleep(0.5)  # Aguarda brevemente para assegurar o envio completo
+            if self._check_printing_status():
+                logging.info("Impressão confirmada para serial: %s", print_job["serial_number"])
+                return True
+            logging.warning("A impressão não foi confirmada para serial: %s", print_job["serial_number"])
+        except Exception as e:
+            logging.error("Erro no worker de impressão: %s", e)
+        self.print_job_log.record_state(print_job["id"], JOB_FAILED)
+        return False
+
+    def _wait_for_printer(self, print_job: Dict[str, Any]) -> None:
+        """
+        Aguarda a impressora ficar pronta sem desistir do job (ex.: troca de papel ou ribbon).
+        Passados printer_not_ready_alert_s, registra o erro e printer_not_ready_for() passa a
+        informar a espera, para que a interface alerte o operador.
+        """
+        self.printer_not_ready_since = time.monotonic()
+        alerted = False
+        try:
+            while not self.is_printer_ready():
+                waited = time.monotonic() - self.printer_not_ready_since
+                if not alerted and waited >= self.printer_not_ready_alert:
+                    alerted = True
+                    logging.error("A impressora não está pronta há %.0f s; etiqueta do serial %s aguardando.",
+                                  waited, print_job["serial_number"])
+                elif not alerted:
+                    logging.warning("A impressora não está pronta para impressão. Aguardando para enviar o job.")
+                time.sleep(1)
+        finally:
+            self.printer_not_ready_since = None
+        if alerted:
+            logging.info("Impressora pronta novamente; retomando a impressão.")
+
+    def printer_not_ready_for(self) -> Optional[float]:
+        """
+        Segundos que o estágio de impressão aguarda a impressora, se já passaram de
+        printer_not_ready_alert_s; caso contrário, None.
+        """
+        since = self.printer_not_ready_since
+        if since is None:
+            return None
+        waited = time.monotonic() - since
+        return waited if waited >= self.printer_not_ready_alert else None
+
+    def _stage_persist(self, job: Dict[str, Any]) -> Optional[str]:
+        """
+        Estágio 'persist': registra a impressão confirmada no CSV e no printed_serials.json.
+        Falhas de gravação são registradas em job["persist_error"]; a etiqueta continua
+        como impressa (job["status"] = "printed").
+        """
+        print_job = job["print_job"]
+        # Jobs gravados no log antes da chave 'serial_no' carregam o registro completo
+        serial_no = print_job.get("serial_no", print_job.get("registro", {}).get("SerialNo", ""))
+        try:
+            with self.lock_csv:
+                self.save_to_csv(print_job["serial_number"],
+                                 print_job["workorder_code_api1"],
+                                 print_job["model_suffix_api1"],
+                                 serial_no)
+        except Exception as ex:
+            logging.error(f"Erro ao registrar no CSV a impressão do serial {print_job['serial_number']}: {ex}")
+            job["persist_error"] = str(ex)
+        try:
+            self._append_printed_serial(print_job["serial_number"],
+                                        print_job["model_suffix_api1"],
+                                        serial_no)
+        except Exception as ex:
+            logging.error(f"Erro ao registrar o serial impresso {print_job['serial_number']}: {ex}")
+            job["persist_error"] = str(ex)
+        return None
 
     def preload_workorder_cache_from_daily_api(self) -> None:
         """
@@ -224,72 +752,334 @@ class LabelManager:
         """
         logging.info("Carregando WorkOrders do dia atual da API de WO...")
         try:
-            current_date = datetime.now().strftime("%Y-%m-%d")
-            url = "http://150.150.251.243:3000/api/prod/wo/get"
-            params = {
-                "parameters.orgCode": self.org_code,
-                "parameters.fromScheduleDate": current_date,
-                "parameters.toScheduleDate": current_date
-            }
-            response = self.session.get(url, params=params, timeout=60)
-            response.raise_for_status()
-            data = response.json()
-            if not isinstance(data, list):
-                logging.error("Formato inesperado dos dados da API de WO.")
+            records = self._fetch_released_workorders()
+            if records is None:
                 return
-
-            filtered = [
-                record for record in data
-                if record.get("LineCode") == "AA1" and record.get("StatusTypeDesc") == "Released"
-            ]
-            work_order_codes = [
-                record.get("WorkOrderCode") for record in filtered if record.get("WorkOrderCode")
-            ]
+            work_order_codes = [record["WorkOrderCode"] for record in records]
             logging.info("WorkOrderCodes encontrados: %s", work_order_codes)
+            # Impressões digitais da lista de WO, usadas pelo refresh em segundo plano para detectar alterações
+            self.workorder_fingerprints = {
+                record["WorkOrderCode"]: self._workorder_fingerprint(record) for record in records
+            }
 
-            cached_workorder_codes = set()
-            if os.path.isfile(self.workorder_cache_file):
-                try:
-                    with open(self.workorder_cache_file, mode='r', encoding='utf-8') as f:
-                        cached_data = json.load(f)
-                        if isinstance(cached_data, list):
-                            for entry in cached_data:
-                                workorder = entry.get("workorder")
-                                if workorder:
-                                    cached_workorder_codes.add(workorder)
-                except Exception as ex:
-                    logging.error("Erro ao ler o arquivo %s: %s", self.workorder_cache_file, ex)
-
+            # O cache em memória já foi carregado do workorder_cache.json
+            cached_workorder_codes = set(self.workorder_cache)
             if set(work_order_codes).issubset(cached_workorder_codes) and len(cached_workorder_codes) > 0:
                 logging.info("Arquivo workorder_cache.json já possui todas as work orders necessárias. Pulando pré-carregamento.")
                 return
 
+            pending_codes = []
             for workorder_code in work_order_codes:
                 if workorder_code in self.workorder_cache:
                     logging.info("WorkOrder %s já possui dados no cache, pulando.", workorder_code)
+                elif workorder_code not in pending_codes:
+                    pending_codes.append(workorder_code)
+
+            pending_codes = self._apply_prefetch_budget(pending_codes)
+            for workorder_code, workorder_data in self._fetch_workorders_concurrently(pending_codes):
+                if not self._fits_cache_budget(workorder_code, workorder_data):
                     continue
+                self._store_workorder(workorder_code, workorder_data)
+        except Exception as ex:
+            logging.error("Erro ao carregar WorkOrders da API: %s", ex)
 
-                params_label = {
-                    "parameters.orgCode": self.org_code,
-                    "parameters.workOrderCode": workorder_code,
-                    "parameters.labelType": self.label_type_for_workorder
-                }
-                workorder_data = self._get_json(self.api_workorder_url, params_label)
+    def _fetch_released_workorders(self) -> Optional[List[Dict[str, Any]]]:
+        """
+        Consulta a API de WO, dia a dia, do dia atual até o fim da janela de antecipação
+        (workorder_prefetch_hours) e retorna os registros liberados (Released) das linhas
+        configuradas, na ordem da programação. Retorna None se a consulta do dia atual falhar.
+
+        O dia de programação de cada workorder (0 = hoje) fica em workorder_schedule_day.
+        """
+        now = datetime.now()
+        last_day = (now + timedelta(hours=max(0, self.workorder_prefetch_hours))).date()
+        records = []
+        schedule_day = {}
+        for day in range((last_day - now.date()).days + 1):
+            schedule_date = (now + timedelta(days=day)).strftime("%Y-%m-%d")
+            try:
+                data = self._fetch_wo_list(schedule_date)
+            except Exception as ex:
+                if day == 0:
+                    raise
+                logging.warning("Erro ao antecipar WorkOrders de %s: %s", schedule_date, ex)
+                continue
+            if data is None:
+                if day == 0:
+                    return None
+                continue
+            for record in data:
+                workorder_code = record.get("WorkOrderCode")
+                if (workorder_code and workorder_code not in schedule_day
+                        and record.get("LineCode") in self.workorder_line_codes
+                        and record.get("StatusTypeDesc") == "Released"):
+                    schedule_day[workorder_code] = day
+                    records.append(record)
+        self.workorder_schedule_day = schedule_day
+        return records
+
+    def _fetch_wo_list(self, schedule_date: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        Consulta a API de WO para uma data de programação.
+        """
+        url = self.api_wo_url
+        params = {
+            "parameters.orgCode": self.org_code,
+            "parameters.fromScheduleDate": schedule_date,
+            "parameters.toScheduleDate": schedule_date
+        }
+        with self.api_recorder.track(url, params) as record:
+            response = self.session.get(url, params=params, timeout=self.api_timeout)
+            record.set_response(response)
+            response.raise_for_status()
+            data = response.json()
+        if not isinstance(data, list):
+            logging.error("Formato inesperado dos dados da API de WO.")
+            return None
+        return data
+
+    def _workorder_cache_bytes(self) -> int:
+        """
+        Estimativa do tamanho do cache de workorders (tamanho do JSON serializado de cada workorder).
+        """
+        with self.lock_workorder_cache:
+            return self._workorder_cache_bytes_locked()
+
+    def _workorder_cache_bytes_locked(self) -> int:
+        """
+        Como _workorder_cache_bytes; deve ser chamado com lock_workorder_cache adquirido.
+        """
+        total = 0
+        for workorder_code, workorder_data in self.workorder_cache.items():
+            size = self.workorder_sizes.get(workorder_code)
+            if size is None:
+                size = len(json.dumps(workorder_data, default=str))
+                self.workorder_sizes[workorder_code] = size
+            total += size
+        return total
+
+    def _apply_prefetch_budget(self, workorder_codes: List[str]) -> List[str]:
+        """
+        Remove da lista as workorders antecipadas (de dias seguintes) se o cache já atingiu o orçamento.
+        As workorders do dia atual são sempre mantidas.
+        """
+        if self._workorder_cache_bytes() < self.workorder_cache_max_bytes:
+            return workorder_codes
+        skipped = [code for code in workorder_codes if self.workorder_schedule_day.get(code, 0) > 0]
+        if skipped:
+            logging.warning("Orçamento do cache de workorders atingido; antecipação adiada para: %s", skipped)
+        return [code for code in workorder_codes if self.workorder_schedule_day.get(code, 0) == 0]
+
+    def _fits_cache_budget(self, workorder_code: str, workorder_data: Any) -> bool:
+        """
+        Verifica se a workorder obtida pode entrar no cache. Workorders do dia atual sempre entram;
+        as antecipadas apenas se o cache continuar dentro de workorder_cache_max_mb.
+        """
+        size = len(json.dumps(workorder_data, default=str))
+        with self.lock_workorder_cache:
+            if self.workorder_schedule_day.get(workorder_code, 0) > 0:
+                used = self._workorder_cache_bytes_locked() - self.workorder_sizes.get(workorder_code, 0)
+                if used + size > self.workorder_cache_max_bytes:
+                    logging.warning("WorkOrder %s não antecipada: orçamento de %.0f MB do cache excedido.",
+                                    workorder_code, self.workorder_cache_max_bytes / (1024 * 1024))
+                    return False
+            self.workorder_sizes[workorder_code] = size
+        return True
+
+    def _evict_workorder_cache(self) -> None:
+        """
+        Mantém o cache de workorders em memória dentro de workorder_cache_max_mb removendo, das
+        obtidas há mais tempo para as mais recentes, as workorders que não constam mais na
+        programação da API de WO. As do dia atual não são removidas, e as antecipadas já são
+        limitadas na entrada (_fits_cache_budget); as gravadas desde a última remoção (ex.: a
+        workorder recém consultada) também são preservadas.
+
+        Executado apenas pelo gravador do workorder_cache.json, que em seguida regrava o arquivo.
+        Sem programação conhecida (API de WO indisponível), nada é removido.
+        """
+        with self.lock_workorder_cache:
+            keep = self.workorder_recently_stored
+            self.workorder_recently_stored = set()
+            if not self.workorder_schedule_day:
+                return
+            excess = self._workorder_cache_bytes_locked() - self.workorder_cache_max_bytes
+            if excess <= 0:
+                return
+            candidates = sorted(
+                (code for code in self.workorder_cache if code not in self.workorder_schedule_day and code not in keep),
+                key=lambda code: self.workorder_fetched_at.get(code, 0.0)
+            )
+            evicted = set()
+            for workorder_code in candidates:
+                if excess <= 0:
+                    break
+                excess -= self.workorder_sizes.get(workorder_code, 0)
+                evicted.add(workorder_code)
+            if excess > 0:
+                logging.warning("Cache de workorders acima do orçamento de %.0f MB apenas com workorders programadas.",
+                                self.workorder_cache_max_bytes / (1024 * 1024))
+            if not evicted:
+                return
+            workorder_cache = {code: data for code, data in self.workorder_cache.items() if code not in evicted}
+            self.workorder_fetched_at = {code: value for code, value in self.workorder_fetched_at.items()
+                                         if code not in evicted}
+            self.workorder_count = {code: value for code, value in self.workorder_count.items()
+                                    if code not in evicted}
+            for workorder_code in evicted:
+                self.workorder_sizes.pop(workorder_code, None)
+            self.workorder_cache = workorder_cache
+        logging.info("Removidas do cache de workorders (fora da programação, orçamento excedido): %s", sorted(evicted))
+
+    @staticmethod
+    def _workorder_fingerprint(record: Dict[str, Any]) -> str:
+        """
+        Gera a impressão digital de um registro da API de WO (qualquer alteração no registro a modifica).
+        """
+        return hashlib.sha1(json.dumps(record, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def _fetch_workorders_concurrently(self, workorder_codes: List[str]) -> Iterator[Tuple[str, Any]]:
+        """
+        Consulta as workorders em paralelo (limitadas pelo token bucket) e retorna,
+        à medida que ficam prontas, os pares (WorkOrderCode, dados) obtidos com sucesso.
+        """
+        total = len(workorder_codes)
+        with ThreadPoolExecutor(max_workers=self.api_max_workers) as executor:
+            futures = {
+                executor.submit(self._fetch_workorder_rate_limited, workorder_code): workorder_code
+                for workorder_code in workorder_codes
+            }
+            for index, future in enumerate(as_completed(futures), start=1):
+                workorder_code = futures[future]
+                try:
+                    workorder_data = future.result()
+                except Exception as ex:
+                    logging.error("Erro ao carregar WorkOrder %s: %s", workorder_code, ex)
+                    continue
                 if workorder_data is None:
-                    logging.warning("Nenhum dado retornado para WorkOrderCode: %s", workorder_code)
-                else:
-                    self.workorder_cache[workorder_code] = workorder_data
-                    if isinstance(workorder_data, list):
-                        self.workorder_count[workorder_code] = len(workorder_data)
-                    self._append_to_json_file(self.workorder_cache_file, {
-                        "workorder": workorder_code,
-                        "data": workorder_data
-                    })
-                    logging.info("WorkOrder %s carregada com sucesso.", workorder_code)
-                
-                time.sleep(1)  # Delay para evitar sobrecarga na API...
+                    logging.warning("(%d/%d) Nenhum dado retornado para WorkOrderCode: %s", index, total, workorder_code)
+                    continue
+                logging.info("(%d/%d) WorkOrder %s obtida da API.", index, total, workorder_code)
+                yield workorder_code, workorder_data
+
+    def _start_workorder_refresher(self) -> None:
+        """
+        Inicia a thread que atualiza periodicamente o cache de workorders durante o turno.
+        """
+        if self.workorder_refresh_interval <= 0:
+            return
+        self.workorder_refresh_stop = threading.Event()
+        self.workorder_refresher = threading.Thread(target=self._workorder_refresh_loop, daemon=True)
+        self.workorder_refresher.start()
+
+    def _workorder_refresh_loop(self) -> None:
+        while not self.workorder_refresh_stop.wait(self.workorder_refresh_interval):
+            try:
+                self.refresh_workorder_cache()
+            except Exception as ex:
+                logging.error("Erro ao atualizar o cache de workorders: %s", ex)
+
+    def refresh_workorder_cache(self) -> None:
+        """
+        Consulta novamente a API de WO e busca apenas as workorders novas ou alteradas
+        (impressão digital diferente). Os dados obtidos substituem o cache de uma só vez
+        (troca de referência do dicionário) e o workorder_cache.json é marcado para regravação.
+        """
+        records = self._fetch_released_workorders()
+        if records is None:
+            return
+        fingerprints = {record["WorkOrderCode"]: self._workorder_fingerprint(record) for record in records}
+        stale = [
+            workorder_code for workorder_code, fingerprint in fingerprints.items()
+            if workorder_code not in self.workorder_cache
+            or self.workorder_fingerprints.get(workorder_code, fingerprint) != fingerprint
+        ]
+        if not stale:
+            self.workorder_fingerprints.update(fingerprints)
+            return
+
+        logging.info("Atualizando %d workorder(s) novas ou alteradas: %s", len(stale), stale)
+        fetched = {
+            workorder_code: workorder_data
+            for workorder_code, workorder_data in self._fetch_workorders_concurrently(self._apply_prefetch_budget(stale))
+            if self._fits_cache_budget(workorder_code, workorder_data)
+        }
+        if fetched:
+            with self.lock_workorder_cache:
+                workorder_cache = dict(self.workorder_cache)
+                workorder_cache.update(fetched)
+                workorder_count = dict(self.workorder_count)
+                workorder_fetched_at = dict(self.workorder_fetched_at)
+                now = time.time()
+                for workorder_code, workorder_data in fetched.items():
+                    workorder_count[workorder_code] = len(workorder_data) if isinstance(workorder_data, list) else 1
+                    workorder_fetched_at[workorder_code] = now
+                self.workorder_fetched_at = workorder_fetched_at
+                self.workorder_count = workorder_count
+                self.workorder_cache = workorder_cache
+                self.workorder_recently_stored.update(fetched)
+            self.workorder_cache_dirty.set()
+        # Workorders que falharam continuam marcadas como desatualizadas para a próxima rodada
+        for workorder_code in fetched.keys() | (fingerprints.keys() - set(stale)):
+            self.workorder_fingerprints[workorder_code] = fingerprints[workorder_code]
+
+    def _start_workorder_cache_writer(self) -> None:
+        """
+        Inicia a thread que grava o workorder_cache.json. Todas as alterações do cache (consultas,
+        refresh e remoções por orçamento) são publicadas em memória e apenas marcam o arquivo como
+        desatualizado (workorder_cache_dirty); esta thread é a única que o grava.
+        """
+        self.workorder_cache_writer = threading.Thread(target=self._workorder_cache_writer_loop,
+                                                       name="workorder-cache-writer", daemon=True)
+        self.workorder_cache_writer.start()
+
+    def _workorder_cache_writer_loop(self) -> None:
+        while True:
+            self.workorder_cache_dirty.wait()
+            # Agrupa as alterações próximas (ex.: pré-carregamento) em uma única regravação
+            time.sleep(self.workorder_cache_write_delay)
+            self.workorder_cache_dirty.clear()
+            try:
+                self._evict_workorder_cache()
+                self._rewrite_workorder_cache_file()
+            except Exception as ex:
+                logging.error("Erro ao gravar o cache de workorders: %s", ex)
+
+    def _rewrite_workorder_cache_file(self) -> None:
+        """
+        Regrava o workorder_cache.json de forma atômica a partir do snapshot atual do cache em
+        memória, sem reler o arquivo. Alterações publicadas durante a gravação marcam o arquivo
+        como desatualizado novamente e entram na próxima regravação.
+        """
+        tmp_path = self.workorder_cache_file + ".tmp"
+        try:
+            with self.lock_workorder_file:
+                with self.lock_workorder_cache:
+                    workorder_cache = self.workorder_cache
+                    workorder_fetched_at = self.workorder_fetched_at
+                with open(tmp_path, mode='w', encoding='utf-8') as f:
+                    json.dump([
+                        {
+                            "workorder": workorder_code,
+                            "data": self._remove_images_from_data(workorder_data),
+                            "fetched_at": workorder_fetched_at.get(workorder_code)
+                        }
+                        for workorder_code, workorder_data in workorder_cache.items()
+                    ], f, indent=4)
+                os.replace(tmp_path, self.workorder_cache_file)
         except Exception as ex:
-            logging.error("Erro ao carregar WorkOrders da API: %s", ex)
+            logging.error(f"Erro ao regravar o arquivo {self.workorder_cache_file}: {ex}")
+
+    def _fetch_workorder_rate_limited(self, workorder_code: str) -> Any:
+        """
+        Consulta a API de workorder respeitando o limite de requisições por segundo.
+        """
+        params_label = {
+            "parameters.orgCode": self.org_code,
+            "parameters.workOrderCode": workorder_code,
+            "parameters.labelType": self.label_type_for_workorder
+        }
+        self.api_rate_limiter.acquire()
+        return self._get_json_records(self.api_workorder_url, params_label)
 
     def _preload_standard_image(self) -> None:
         """
@@ -305,6 +1095,8 @@ class LabelManager:
     def _load_api1_cache(self) -> None:
         if os.path.isfile(self.api1_cache_file):
             try:
+                # Entradas gravadas antes do registro de 'fetched_at' assumem a data de modificação do arquivo
+                file_mtime = os.path.getmtime(self.api1_cache_file)
                 with open(self.api1_cache_file, mode='r', encoding='utf-8') as f:
                     data = json.load(f)
                     if isinstance(data, list):
@@ -314,6 +1106,7 @@ class LabelManager:
                             model_suffix = entry.get("ModelSuffix", "")
                             if workorder:
                                 self.api1_cache[workorder] = (workorder_code, model_suffix)
+                                self.api1_fetched_at[workorder] = entry.get("fetched_at") or file_mtime
                 logging.info("Cache API1 carregado com sucesso.")
             except Exception as ex:
                 logging.error(f"Erro ao carregar cache API1: {ex}")
@@ -321,6 +1114,7 @@ class LabelManager:
     def _load_workorder_cache(self) -> None:
         if os.path.isfile(self.workorder_cache_file):
             try:
+                file_mtime = os.path.getmtime(self.workorder_cache_file)
                 with open(self.workorder_cache_file, mode='r', encoding='utf-8') as f:
                     data = json.load(f)
                     if isinstance(data, list):
@@ -329,6 +1123,7 @@ class LabelManager:
                             workorder_data = entry.get("data")
                             if workorder and workorder_data:
                                 self.workorder_cache[workorder] = workorder_data
+                                self.workorder_fetched_at[workorder] = entry.get("fetched_at") or file_mtime
                                 if isinstance(workorder_data, list):
                                     self.workorder_count[workorder] = len(workorder_data)
                                 else:
@@ -343,11 +1138,12 @@ class LabelManager:
                 with open(self.printed_serials_file, mode='r', encoding='utf-8') as f:
                     data = json.load(f)
                     if isinstance(data, list):
-                        for record in data:
-                            if record.get("printed", False):
-                                serial = record.get("serial")
-                                if serial:
-                                    self.printed_serials.add(serial)
+                        serials = {
+                            record.get("serial") for record in data
+                            if record.get("printed", False) and record.get("serial")
+                        }
+                        with self.lock_printed_serials:
+                            self.printed_serials = serials
                 logging.info("Seriais impressos carregados com sucesso.")
             except Exception as ex:
                 logging.error(f"Erro ao carregar os seriais impressos: {ex}")
@@ -371,9 +1167,7 @@ class LabelManager:
         Acrescenta uma nova entrada no arquivo JSON especificado, garantindo acesso thread-safe.
         """
         try:
-            with self.lock_file:
-                if file_path == self.workorder_cache_file and "data" in data:
-                    data["data"] = self._remove_images_from_data(data["data"])
+            with self.file_locks[file_path]:
                 if os.path.isfile(file_path):
                     with open(file_path, mode='r', encoding='utf-8') as f:
                         try:
@@ -385,10 +1179,9 @@ class LabelManager:
                 else:
                     existing_data = []
                 if file_path == self.api1_cache_file:
-                    for record in existing_data:
-                        if record.get("workorder") == data.get("workorder"):
-                            logging.info(f"Registro com workorder '{data.get('workorder')}' já existe em {file_path}.")
-                            return
+                    # Mantém uma única entrada por workorder (a mais recente, inclusive após revalidação)
+                    existing_data = [record for record in existing_data
+                                     if record.get("workorder") != data.get("workorder")]
                 existing_data.append(data)
                 with open(file_path, mode='w', encoding='utf-8') as f:
                     json.dump(existing_data, f, indent=4)
@@ -400,7 +1193,7 @@ class LabelManager:
         Adiciona o serial impresso ao arquivo printed_serials.json, de forma thread-safe.
         """
         try:
-            with self.lock_file:
+            with self.lock_printed_serials_file:
                 if os.path.isfile(self.printed_serials_file):
                     with open(self.printed_serials_file, mode='r', encoding='utf-8') as f:
                         try:
@@ -426,10 +1219,20 @@ class LabelManager:
         except Exception as ex:
             logging.error(f"Erro ao atualizar o arquivo de seriais impressos: {ex}")
 
-    def consulta_api(self, serial_number: str) -> Tuple[str, str]:
+    def consulta_api(self, serial_number: str) -> Tuple[str, str, str]:
+        """
+        Consulta a API de serial number.
+        Retorna (WorkOrderCode, ModelSuffix, ZPL); o ZPL da etiqueta da primeira API (se houver)
+        é impresso pelo estágio 'print' do pipeline, como as demais etiquetas.
         """
-        Consulta a API de serial number e, se houver comando ZPL, envia-o para impressão.
-        Retorna (WorkOrderCode, ModelSuffix).
+        item = self._fetch_serial_info(serial_number)
+        if item is None:
+            return "", "", ""
+        return item.get("WorkOrderCode", ""), item.get("ModelSuffix", ""), item.get("ZPL", "")
+
+    def _fetch_serial_info(self, serial_number: str) -> Optional[Dict[str, Any]]:
+        """
+        Consulta a API de serial number sem imprimir. Retorna o registro do serial ou None em caso de falha.
         """
         params = {
             "parameters.serialNumber": serial_number,
@@ -437,45 +1240,144 @@ class LabelManager:
         }
         data = self._get_json(self.api_serial_url, params)
         if data is None:
-            return "", ""
+            return None
         logging.info(f"Resposta da API Serial Number ({serial_number}): {data}")
         if isinstance(data, list) and data:
-            item = data[0]
-        elif isinstance(data, dict):
-            item = data
-        else:
-            item = {}
+            return data[0]
+        if isinstance(data, dict):
+            return data
+        return {}
+
+    def _store_api1(self, workorder: str, workorder_code: str, model_suffix: str) -> None:
+        """
+        Atualiza o cache API1 em memória e no api1_cache.json.
+        """
+        fetched_at = time.time()
+        with self.lock_api1_cache:
+            api1_fetched_at = dict(self.api1_fetched_at)
+            api1_fetched_at[workorder] = fetched_at
+            api1_cache = dict(self.api1_cache)
+            api1_cache[workorder] = (workorder_code, model_suffix)
+            self.api1_fetched_at = api1_fetched_at
+            self.api1_cache = api1_cache
+        self._append_to_json_file(self.api1_cache_file, {
+            "workorder": workorder,
+            "WorkOrderCode": workorder_code,
+            "ModelSuffix": model_suffix,
+            "fetched_at": fetched_at
+        })
+
+    def _revalidate_serial_info(self, workorder: str, serial_number: str) -> None:
+        """
+        Revalida em segundo plano a entrada do cache API1 (sem imprimir a etiqueta da primeira API).
+        """
+        item = self._fetch_serial_info(serial_number)
+        if not item:
+            return
         workorder_code = item.get("WorkOrderCode", "")
         model_suffix = item.get("ModelSuffix", "")
-        zpl_code = item.get("ZPL", "")
-        if zpl_code:
-            logging.info("Imprimindo etiqueta da primeira API...")
-            self.print_zpl(zpl_code)
-        return workorder_code, model_suffix
+        if (workorder_code, model_suffix) != self.api1_cache.get(workorder):
+            logging.info(f"Cache API1 de {workorder} atualizado na revalidação: {workorder_code} / {model_suffix}")
+        self._store_api1(workorder, workorder_code, model_suffix)
 
-    def _get_json(self, url: str, params: dict, max_attempts: int = 5, delay: int = 5) -> Any:
+    def _cache_age(self, fetched_at: Dict[str, float], key: str) -> float:
         """
-        Executa um GET na URL e retorna o JSON da resposta, re-tentando em caso de erro ou timeout.
+        Idade (em segundos) de uma entrada de cache; entradas sem registro são consideradas expiradas.
         """
-        attempt = 0
-        while attempt < max_attempts:
-            try:
-                response = self.session.get(url, params=params, timeout=60)
+        return time.time() - fetched_at.get(key, 0.0)
+
+    def _schedule_revalidation(self, key: Tuple[Any, ...], func, *args) -> None:
+        """
+        Agenda a revalidação de uma entrada de cache em segundo plano. Durante uma queda da API,
+        cada entrada é retentada no máximo uma vez a cada REVALIDATION_RETRY_S segundos.
+        """
+        now = time.monotonic()
+        with self.revalidation_lock:
+            last_attempt = self.revalidation_attempts.get(key)
+            if last_attempt is not None and now - last_attempt < self.REVALIDATION_RETRY_S:
+                return
+            self.revalidation_attempts[key] = now
+        self.lookup_executor.submit(self.single_flight.do, ("revalidate",) + key, func, *args)
+
+    def _set_api_online(self, online: bool) -> None:
+        with self.revalidation_lock:
+            changed = online != self.api_online
+            self.api_online = online
+        if changed and online:
+            logging.info("API restabelecida; saindo do modo offline.")
+        elif changed:
+            logging.warning("API indisponível: operando em modo offline com os dados em cache.")
+
+    def _get_json(self, url: str, params: dict) -> Any:
+        """
+        Executa um GET na URL e retorna o JSON da resposta, ou None em caso de falha.
+        As novas tentativas (com backoff) e os timeouts são aplicados pela sessão HTTP,
+        e requisições idênticas simultâneas compartilham uma única chamada.
+        """
+        return self.single_flight.do(self._request_key("json", url, params), self._fetch_json, url, params)
+
+    @staticmethod
+    def _request_key(kind: str, url: str, params: dict) -> Tuple[Any, ...]:
+        return ("http", kind, url, tuple(sorted((key, str(value)) for key, value in params.items())))
+
+    def _fetch_json(self, url: str, params: dict) -> Any:
+        try:
+            with self.api_recorder.track(url, params) as record:
+                response = self.session.get(url, params=params, timeout=self.api_timeout)
+                record.set_response(response)
                 response.raise_for_status()
-                return response.json()
-            except requests.exceptions.ReadTimeout as e:
-                attempt += 1
-                logging.warning(
-                    f"Timeout na requisição a {url}. Tentativa {attempt}/{max_attempts}. Aguardando {delay} segundos..."
-                )
-                time.sleep(delay)
-            except Exception as ex:
-                attempt += 1
-                logging.error(
-                    f"Erro na requisição a {url}: {ex}. Tentativa {attempt}/{max_attempts}. Aguardando {delay} segundos..."
-                )
-                time.sleep(delay)
-        logging.error(f"Falha ao carregar dados da API {url} após {max_attempts} tentativas.")
+                data = response.json()
+            self._set_api_online(True)
+            return data
+        except requests.exceptions.Timeout:
+            self._set_api_online(False)
+            logging.error(f"Timeout na requisição a {url} após {self.api_max_retries} novas tentativas.")
+        except requests.exceptions.RetryError as ex:
+            self._set_api_online(False)
+            logging.error(f"Falha ao carregar dados da API {url}: limite de novas tentativas atingido ({ex}).")
+        except requests.exceptions.RequestException as ex:
+            self._set_api_online(False)
+            logging.error(f"Erro na requisição a {url}: {ex}")
+        except Exception as ex:
+            logging.error(f"Erro na requisição a {url}: {ex}")
+        return None
+
+    def _get_json_records(self, url: str, params: dict) -> Optional[List[Any]]:
+        """
+        Variante de _get_json para respostas grandes em forma de array (API de workorder).
+
+        A resposta é lida em streaming (com compressão gzip aceita pela sessão) e interpretada
+        registro a registro; as imagens ('Images'/'images') são removidas de cada registro assim
+        que ele é interpretado. O pico de memória fica limitado aos registros já sem imagens
+        mais um registro em construção. Retorna a lista de registros ou None em caso de falha.
+        """
+        return self.single_flight.do(self._request_key("records", url, params), self._fetch_json_records, url, params)
+
+    def _fetch_json_records(self, url: str, params: dict) -> Optional[List[Any]]:
+        try:
+            with self.api_recorder.track(url, params) as record, \
+                    self.session.get(url, params=params, timeout=self.api_timeout, stream=True) as response:
+                record.set_response(response)
+                response.raise_for_status()
+                records = []
+                for item in iter_json_array(response.iter_content(chunk_size=64 * 1024)):
+                    if isinstance(item, dict):
+                        item.pop("Images", None)
+                        item.pop("images", None)
+                    records.append(item)
+                self._set_api_online(True)
+                return records
+        except requests.exceptions.Timeout:
+            self._set_api_online(False)
+            logging.error(f"Timeout na requisição a {url} após {self.api_max_retries} novas tentativas.")
+        except requests.exceptions.RetryError as ex:
+            self._set_api_online(False)
+            logging.error(f"Falha ao carregar dados da API {url}: limite de novas tentativas atingido ({ex}).")
+        except requests.exceptions.RequestException as ex:
+            self._set_api_online(False)
+            logging.error(f"Erro na requisição a {url}: {ex}")
+        except Exception as ex:
+            logging.error(f"Erro na requisição a {url}: {ex}")
         return None
 
     def is_printer_ready(self) -> bool:
@@ -525,10 +1427,7 @@ class LabelManager:
                 printer_ready = (paper_status == "Papel OK" and
                                 pause_status == "Pause (OFF)" and
                                 ribbon_status == "Ribbon OK")
-                if printer_ready:
-                    write_modbus_register('OK')
-                else:
-                    write_modbus_register('NG')
+                write_modbus_register_async('OK' if printer_ready else 'NG')
                 return printer_ready
         except Exception as ex:
             logging.error("Erro ao verificar status da impressora: %s", ex)
@@ -705,8 +1604,16 @@ class LabelManager:
             return len(data)
         return 1
 
+    def get_printed_serials_snapshot(self) -> FrozenSet[str]:
+        """
+        Cópia dos seriais impressos para iteração fora do lock.
+        """
+        with self.lock_printed_serials:
+            return frozenset(self.printed_serials)
+
     def get_printed_count_for_workorder(self, workorder_code: str) -> int:
-        return sum(1 for sn in self.printed_serials if self.get_workorder_from_serial(sn) == workorder_code)
+        return sum(1 for sn in self.get_printed_serials_snapshot()
+                   if self.get_workorder_from_serial(sn) == workorder_code)
 
     def get_remaining_labels(self, workorder_code: str) -> int:
         return self.get_total_labels(workorder_code) - self.get_printed_count_for_workorder(workorder_code)
@@ -772,49 +1679,62 @@ class LabelManager:
             logging.error(f"Erro ao consultar status da impressora: {e}")
             return False
 
-    def consulta_workorder(self,
-                           sequence_number: int,
-                           serial_number: str,
-                           workorder_code_api1: str,
-                           model_suffix_api1: str,
-                           allow_duplicate: bool = False) -> None:
+    def _stage_render(self, job: Dict[str, Any]) -> Optional[str]:
+        """
+        Estágio 'render': gera os jobs de impressão do serial (a etiqueta da primeira API, se a
+        consulta retornou ZPL, e a etiqueta da workorder) e os registra no log antes de
+        entregá-los ao estágio 'print'.
+        """
+        print_jobs = []
+        api1_zpl = job.pop("api1_zpl", "")
+        if api1_zpl:
+            logging.info("Enfileirando etiqueta da primeira API...")
+            print_jobs.append({
+                "id": PrintJobLog.new_job_id(),
+                "label": LABEL_API1,
+                "zpl": api1_zpl,
+                "serial_number": job["serial_number"],
+                "allow_duplicate": job["allow_duplicate"]
+            })
+        print_job = self._render_workorder_label(job)
+        if print_job is not None:
+            print_jobs.append(print_job)
+        if not print_jobs:
+            return None
+        for print_job in print_jobs:
+            self.print_job_log.record_queued(print_job)
+        job["print_jobs"] = print_jobs
+        return "print"
+
+    def _render_workorder_label(self, job: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """
-        Consulta a API de workorder e prepara o job para impressão.
-        Em vez de enviar o ZPL diretamente, o job é enfileirado 
-        para ser processado pelo worker de impressão.
+        Seleciona o registro da workorder correspondente ao serial e converte o ZPL.
+        Retorna o job de impressão da etiqueta, ou None (com job["status"] indicando o motivo).
         """
-        workorder_code = workorder_code_api1 if workorder_code_api1 else self.get_workorder_from_serial(serial_number)
+        serial_number = job["serial_number"]
+        sequence_number = job["sequence_number"]
+        workorder_code_api1 = job["workorder_code_api1"]
+        model_suffix_api1 = job["model_suffix_api1"]
+        workorder_code = workorder_code_api1 if workorder_code_api1 else job["workorder_from_serial"]
         if not workorder_code:
             logging.error("Erro ao extrair workorder do serial.")
-            return
-        
-        if not allow_duplicate and serial_number in self.printed_serials:
+            job["status"] = "invalid"
+            return None
+
+        if not job["allow_duplicate"] and serial_number in self.printed_serials:
             logging.warning(f"O serial {serial_number} já foi impresso anteriormente!")
             remaining = self.get_remaining_labels(workorder_code)
             logging.info(f"Total de etiquetas restantes para {workorder_code}: {remaining}")
-            return
-
-        # Use self.label_type_for_workorder read from config
-        params_label = {
-            "parameters.orgCode": self.org_code,
-            "parameters.workOrderCode": workorder_code,
-            "parameters.labelType": self.label_type_for_workorder,
-        }
+            job["status"] = "duplicate"
+            return None
 
-        if workorder_code in self.workorder_cache and self.get_total_labels(workorder_code) > 0:
-            data = self.workorder_cache[workorder_code]
-            logging.info(f"Usando dados do cache para workorder {workorder_code}...")
-        else:
-            data = self._get_json(self.api_workorder_url, params_label)
-            if data is None:
-                return
-            self.workorder_cache[workorder_code] = data
-            if isinstance(data, list):
-                self.workorder_count[workorder_code] = len(data)
-            logging.info(f"Dados obtidos da API para {workorder_code} e armazenados em cache.")
-            logging.info(f"Total de etiquetas disponíveis: {self.get_total_labels(workorder_code)}")
-            self._append_to_json_file(self.workorder_cache_file, {"workorder": workorder_code, "data": data})
+        data = job.pop("workorder_data", None)
+        if data is None:
+            job["status"] = "lookup_failed"
+            return None
 
+        print_job = None
+        job["status"] = "no_record"
         if isinstance(data, list) and len(data) >= sequence_number:
             registro = data[sequence_number - 1]
             logging.info(f"Registro {sequence_number} do WorkOrder: {registro}")
@@ -828,20 +1748,111 @@ class LabelManager:
                     move_y=self.desired_move_y
                 )
                 logging.info("ZPL convertido para 600 DPI, enfileirando job de impressão...")
-                job = {
+                print_job = {
+                    "id": PrintJobLog.new_job_id(),
+                    "label": LABEL_WORKORDER,
                     "zpl": zpl_converted,
-                    "registro": registro,
+                    "serial_no": registro.get("SerialNo", ""),
+                    "workorder_code": registro.get("WorkOrderCode", workorder_code),
                     "serial_number": serial_number,
                     "workorder_code_api1": workorder_code_api1,
-                    "model_suffix_api1": model_suffix_api1
+                    "model_suffix_api1": model_suffix_api1,
+                    "allow_duplicate": job["allow_duplicate"]
                 }
-                self.print_queue.put(job)
+                job["status"] = "queued"
             else:
                 logging.warning("Código ZPL não encontrado no registro.")
         else:
             logging.warning(f"Não foi encontrado o registro {sequence_number} no WorkOrder.")
 
         logging.info(f"Total de etiquetas restantes para {workorder_code}: {self.get_remaining_labels(workorder_code)}")
+        return print_job
+
+    def _get_workorder_data(self, workorder_code: str) -> Any:
+        """
+        Retorna os dados da workorder a partir do cache ou, se ausente, da API de workorder
+        (armazenando-os no cache em memória e no workorder_cache.json). Retorna None em caso de falha.
+
+        Consultas simultâneas da mesma workorder são agrupadas: apenas uma vai à API e grava o cache.
+
+        Dados em cache mais antigos que cache_fresh_ttl_s são usados imediatamente e revalidados em
+        segundo plano; acima de cache_max_stale_s, é feita uma nova consulta antes de usá-los.
+        """
+        # Uma única leitura da referência: o gravador pode remover a workorder do cache a qualquer momento
+        data = self.workorder_cache.get(workorder_code)
+        if data is not None and (not isinstance(data, list) or len(data) > 0):
+            age = self._cache_age(self.workorder_fetched_at, workorder_code)
+            if age < self.cache_max_stale:
+                if age >= self.cache_fresh_ttl:
+                    self._schedule_revalidation(("workorder", workorder_code), self._revalidate_workorder, workorder_code)
+                logging.info(f"Usando dados do cache para workorder {workorder_code}...")
+                return data
+            logging.warning(f"Dados em cache da workorder {workorder_code} expirados ({age / 3600:.1f} h); consultando a API...")
+        return self.single_flight.do(("workorder", workorder_code), self._load_workorder_data, workorder_code)
+
+    def _has_usable_workorder(self, workorder_code: str) -> bool:
+        """
+        Indica se a workorder está em cache e dentro de cache_max_stale_s (utilizável sem consultar a API).
+        """
+        return (workorder_code in self.workorder_cache and self.get_total_labels(workorder_code) > 0
+                and self._cache_age(self.workorder_fetched_at, workorder_code) < self.cache_max_stale)
+
+    def _load_workorder_data(self, workorder_code: str) -> Any:
+        # Outra thread pode ter preenchido o cache enquanto esta aguardava
+        data = self.workorder_cache.get(workorder_code)
+        if data is not None and self._has_usable_workorder(workorder_code):
+            return data
+
+        # Use self.label_type_for_workorder read from config
+        params_label = {
+            "parameters.orgCode": self.org_code,
+            "parameters.workOrderCode": workorder_code,
+            "parameters.labelType": self.label_type_for_workorder,
+        }
+        data = self._get_json_records(self.api_workorder_url, params_label)
+        if data is None:
+            return None
+        self._store_workorder(workorder_code, data)
+        logging.info(f"Dados obtidos da API para {workorder_code} e armazenados em cache.")
+        logging.info(f"Total de etiquetas disponíveis: {self.get_total_labels(workorder_code)}")
+        return data
+
+    def _store_workorder(self, workorder_code: str, data: Any) -> None:
+        """
+        Atualiza o cache de workorders em memória e marca o workorder_cache.json para ser
+        regravado pelo gravador em segundo plano.
+        """
+        fetched_at = time.time()
+        with self.lock_workorder_cache:
+            workorder_fetched_at = dict(self.workorder_fetched_at)
+            workorder_fetched_at[workorder_code] = fetched_at
+            workorder_count = dict(self.workorder_count)
+            workorder_count[workorder_code] = len(data) if isinstance(data, list) else 1
+            workorder_cache = dict(self.workorder_cache)
+            workorder_cache[workorder_code] = data
+            self.workorder_sizes.pop(workorder_code, None)
+            self.workorder_recently_stored.add(workorder_code)
+            self.workorder_fetched_at = workorder_fetched_at
+            self.workorder_count = workorder_count
+            self.workorder_cache = workorder_cache
+        self.workorder_cache_dirty.set()
+
+    def _revalidate_workorder(self, workorder_code: str) -> None:
+        """
+        Revalida em segundo plano os dados de uma workorder servida do cache.
+        Em caso de falha, os dados em cache continuam sendo usados.
+        """
+        params_label = {
+            "parameters.orgCode": self.org_code,
+            "parameters.workOrderCode": workorder_code,
+            "parameters.labelType": self.label_type_for_workorder,
+        }
+        data = self._get_json_records(self.api_workorder_url, params_label)
+        if data is None:
+            return
+        if data != self.workorder_cache.get(workorder_code):
+            logging.info(f"WorkOrder {workorder_code} atualizada na revalidação em segundo plano.")
+        self._store_workorder(workorder_code, data)
 
     @staticmethod
     def get_sequence_number(serial: str) -> int:
@@ -864,25 +1875,60 @@ class LabelManager:
         pattern = r'^[A-Za-z0-9]+-\d+$'
         if re.match(pattern, serial_number):
             return True
-        write_modbus_register('NG')
+        write_modbus_register_async('NG')
         logging.error("Formato de serial inválido!")
         return False
 
-    def process_serial(self, serial_number: str, allow_duplicate: bool = False) -> None:
+    def _log_read_confirmation(self, future) -> None:
         """
-        Processa o serial: consulta as APIs, atualiza caches e enfileira o job de impressão.
+        Callback da escrita assíncrona da confirmação de leitura no Modbus.
         """
-        if not self.validate_serial(serial_number):
-            return
-            
-        # Registra valor 1 no endereço 3 do Modbus para indicar que uma leitura foi realizada
         try:
-            from modbusclient import write_modbus_register_address
-            write_modbus_register_address(self.modbus_address_read_confirmation, 1)
-            logging.info("Registro de leitura: valor 1 escrito no endereço 3 do Modbus")
+            if future.result():
+                logging.info("Registro de leitura: valor 1 escrito no endereço %s do Modbus",
+                             self.modbus_address_read_confirmation)
+            else:
+                logging.error("Falha ao registrar leitura no Modbus.")
         except Exception as ex:
             logging.error(f"Erro ao registrar leitura no Modbus: {ex}")
-            
+
+    def accept_scan(self, barcode: str) -> bool:
+        """
+        Filtro de leituras dos scanners, aplicado antes de qualquer E/S: retorna False (e a leitura
+        deve ser descartada) se o mesmo código foi lido há menos de scan_dedup_window_ms.
+        """
+        if self.scan_debouncer.accept(barcode):
+            return True
+        logging.debug("Leitura repetida descartada: %s", barcode)
+        return False
+
+    def process_serial(self, serial_number: str, allow_duplicate: bool = False,
+                       block: bool = True, timeout: Optional[float] = None) -> Future:
+        """
+        Entrega o serial ao pipeline de processamento (validação, consultas às APIs, conversão do ZPL,
+        impressão e registro). Bloqueia enquanto a fila de entrada do pipeline estiver cheia; com
+        block=False (ou esgotado o timeout), lança queue.Full.
+        Retorna um Future concluído com o job ao final do processamento; job["status"] indica o resultado.
+        """
+        return self.pipeline.submit({"serial_number": serial_number, "allow_duplicate": allow_duplicate},
+                                    block=block, timeout=timeout)
+
+    def _stage_validate(self, job: Dict[str, Any]) -> Optional[str]:
+        """
+        Estágio 'validate': valida o serial, registra a leitura no Modbus e decide se o job precisa
+        consultar as APIs ('lookup') ou pode seguir direto para 'render' com os dados em cache.
+        """
+        serial_number = job["serial_number"]
+        allow_duplicate = job["allow_duplicate"]
+        if not self.validate_serial(serial_number):
+            job["status"] = "invalid"
+            return None
+
+        # Registra valor 1 no endereço de confirmação do Modbus para indicar que uma leitura foi realizada.
+        # A escrita é enfileirada, para que a consulta às APIs comece imediatamente.
+        write_future = write_modbus_register_address_async(self.modbus_address_read_confirmation, 1)
+        write_future.add_done_callback(self._log_read_confirmation)
+
         if allow_duplicate:
             if serial_number in self.printed_serials:
                 logging.info("Reimpressão manual solicitada para o serial: %s", serial_number)
@@ -890,21 +1936,90 @@ class LabelManager:
                 logging.info("Impressão solicitada para o serial: %s", serial_number)
         workorder_from_serial = self.get_workorder_from_serial(serial_number)
         sequence_number = self.get_sequence_number(serial_number)
-        
-        if sequence_number == 1 or workorder_from_serial not in self.api1_cache:
-            logging.info("Consultando API para dados do serial...")
-            workorder_code_api1, model_suffix_api1 = self.consulta_api(serial_number)
-            self.api1_cache[workorder_from_serial] = (workorder_code_api1, model_suffix_api1)
-            self._append_to_json_file(self.api1_cache_file, {
-                "workorder": workorder_from_serial,
-                "WorkOrderCode": workorder_code_api1,
-                "ModelSuffix": model_suffix_api1
-            })
-        else:
-            logging.info("WorkOrder encontrada no cache. Utilizando dados em cache para a consulta.")
+        job["workorder_from_serial"] = workorder_from_serial
+        job["sequence_number"] = sequence_number
+
+        api1_age = self._cache_age(self.api1_fetched_at, workorder_from_serial)
+        if (sequence_number == 1 or workorder_from_serial not in self.api1_cache
+                or api1_age >= self.cache_max_stale):
+            job["needs_api1"] = True
+            return "lookup"
+
+        logging.info("WorkOrder encontrada no cache. Utilizando dados em cache para a consulta.")
+        workorder_code_api1, model_suffix_api1 = self.api1_cache[workorder_from_serial]
+        if api1_age >= self.cache_fresh_ttl:
+            self._schedule_revalidation(("api1", workorder_from_serial), self._revalidate_serial_info,
+                                        workorder_from_serial, serial_number)
+        job["workorder_code_api1"] = workorder_code_api1
+        job["model_suffix_api1"] = model_suffix_api1
+        workorder_code = workorder_code_api1 or workorder_from_serial
+        if not allow_duplicate and serial_number in self.printed_serials:
+            return "render"
+        if self._has_usable_workorder(workorder_code):
+            job["workorder_data"] = self._get_workorder_data(workorder_code)
+            return "render"
+        return "lookup"
+
+    def _stage_lookup(self, job: Dict[str, Any]) -> Optional[str]:
+        """
+        Estágio 'lookup': consulta a API de serial number (quando necessário) e obtém os dados
+        da workorder (cache, revalidação ou API).
+        """
+        serial_number = job["serial_number"]
+        allow_duplicate = job["allow_duplicate"]
+        workorder_from_serial = job["workorder_from_serial"]
+        if job.get("needs_api1"):
+            api1_age = self._cache_age(self.api1_fetched_at, workorder_from_serial)
+            cached_api1 = self.api1_cache.get(workorder_from_serial)
+            if not self.api_online and cached_api1 is not None and api1_age < self.cache_max_stale:
+                # Modo offline: usa o cache sem aguardar as novas tentativas da API; a revalidação
+                # em segundo plano (limitada a uma por REVALIDATION_RETRY_S) detecta o retorno da API
+                logging.warning("API em modo offline; utilizando dados em cache da WorkOrder e revalidando em segundo plano.")
+                workorder_code_api1, model_suffix_api1 = cached_api1
+                self._schedule_revalidation(("api1", workorder_from_serial), self._revalidate_serial_info,
+                                            workorder_from_serial, serial_number)
+            else:
+                workorder_code_api1, model_suffix_api1 = self._lookup_serial_api(job, api1_age)
+            job["workorder_code_api1"] = workorder_code_api1
+            job["model_suffix_api1"] = model_suffix_api1
+
+        workorder_code = job["workorder_code_api1"] or workorder_from_serial
+        if workorder_code and (allow_duplicate or serial_number not in self.printed_serials):
+            job["workorder_data"] = self._get_workorder_data(workorder_code)
+        return "render"
+
+    def _lookup_serial_api(self, job: Dict[str, Any], api1_age: float) -> Tuple[str, str]:
+        """
+        Consulta a API de serial number para o job (guardando em job["api1_zpl"] o ZPL da
+        etiqueta da primeira API) e retorna (WorkOrderCode, ModelSuffix). Sem resposta, usa o
+        cache API1 se ainda estiver dentro de cache_max_stale_s.
+        """
+        serial_number = job["serial_number"]
+        workorder_from_serial = job["workorder_from_serial"]
+        # A workorder derivada do serial é consultada em paralelo à API de serial number,
+        # de modo que as duas consultas custem um único tempo de ida e volta.
+        workorder_lookup = None
+        if (workorder_from_serial not in self.workorder_cache
+                and (job["allow_duplicate"] or serial_number not in self.printed_serials)):
+            workorder_lookup = self.lookup_executor.submit(self._get_workorder_data, workorder_from_serial)
+        logging.info("Consultando API para dados do serial...")
+        workorder_code_api1, model_suffix_api1, job["api1_zpl"] = self.consulta_api(serial_number)
+        if workorder_lookup is not None:
+            try:
+                workorder_lookup.result()
+            except Exception as ex:
+                logging.error(f"Erro na consulta antecipada da workorder {workorder_from_serial}: {ex}")
+        if workorder_code_api1 and workorder_code_api1 != workorder_from_serial:
+            # Reconciliação: prevalece a WorkOrderCode retornada pela API de serial number
+            logging.warning(f"WorkOrderCode da API ({workorder_code_api1}) difere da derivada do serial "
+                            f"({workorder_from_serial}); utilizando a da API.")
+        if workorder_code_api1 or model_suffix_api1:
+            self._store_api1(workorder_from_serial, workorder_code_api1, model_suffix_api1)
+        elif workorder_from_serial in self.api1_cache and api1_age < self.cache_max_stale:
+            # API indisponível: segue com os dados em cache (modo offline)
+            logging.warning("API de serial number sem resposta; utilizando dados em cache da WorkOrder.")
             workorder_code_api1, model_suffix_api1 = self.api1_cache[workorder_from_serial]
-        
-        self.consulta_workorder(sequence_number, serial_number, workorder_code_api1, model_suffix_api1, allow_duplicate=allow_duplicate)
+        return workorder_code_api1, model_suffix_api1
 
     def read_barcode_from_scanner(self) -> str:
         """
@@ -970,6 +2085,8 @@ def main() -> None:
             while True:
                 serial_number = label_manager.read_barcode_from_scanner()
                 if serial_number:
+                    if not label_manager.accept_scan(serial_number):
+                        continue
                     logging.info("Código de barras recebido do scanner principal: %s", serial_number)
                     label_manager.process_serial(serial_number)
         except Exception as e:
@@ -981,6 +2098,8 @@ def main() -> None:
             while True:
                 serial_number = label_manager.read_barcode_from_scanner2()
                 if serial_number:
+                    if not label_manager.accept_scan(serial_number):
+                        continue
                     logging.info("Código de barras recebido do scanner secundário: %s", serial_number)
                     label_manager.process_serial(serial_number)
         except Exception as e:
@@ -0,0 +1,215 @@
+import argparse
+import logging
+import random
+import threading
+import time
+
+from pyModbusTCP.server import ModbusServer, DataBank
+
+import modbusclient
+from modbusclient import (load_modbus_config, monitor_modbus_input, set_modbus_config_overrides,
+                          write_modbus_register_address_async, ModbusMonitorStats, ModbusRegisterPoller)
+from latency_stats import window_summary
+
+
+class RecordingDataBank(DataBank):
+    """
+    DataBank que registra, com timestamp, toda escrita de holding register feita por clientes.
+    """
+    def __init__(self):
+        super().__init__()
+        self.writes_lock = threading.Lock()
+        self.writes = []
+
+    def set_holding_registers(self, address, word_list, srv_info=None):
+        result = super().set_holding_registers(address, word_list, srv_info)
+        if srv_info is not None and result:
+            now = time.perf_counter()
+            with self.writes_lock:
+                for offset, value in enumerate(word_list):
+                    self.writes.append((now, address + offset, int(value)))
+        return result
+
+    def writes_to(self, address, since):
+        """
+        Retorna as escritas (timestamp, valor) feitas por clientes no endereço, a partir de 'since'.
+        """
+        with self.writes_lock:
+            return [(ts, value) for ts, reg, value in self.writes if reg == address and ts >= since]
+
+
+class PlcSimulator:
+    """
+    Servidor Modbus TCP em processo que substitui o CLP em testes e benchmarks.
+    Enquanto estiver ativo, o modbusclient é redirecionado para ele.
+    """
+    def __init__(self, host="127.0.0.1", port=5020):
+        self.host = host
+        self.port = port
+        self.data_bank = RecordingDataBank()
+        self.server = ModbusServer(host=host, port=port, no_block=True, data_bank=self.data_bank)
+
+    def start(self):
+        self.server.start()
+        set_modbus_config_overrides({"modbus_host": self.host, "modbus_port": self.port})
+        logging.info(f"Simulador de CLP ativo em {self.host}:{self.port}")
+
+    def stop(self):
+        set_modbus_config_overrides()
+        modbusclient.get_modbus_client_pool().close_all()
+        self.server.stop()
+
+    def set_register(self, address, value):
+        self.data_bank.set_holding_registers(address, [value])
+
+    def get_register(self, address):
+        values = self.data_bank.get_holding_registers(address)
+        return values[0] if values else None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+class SensorPulseGenerator:
+    """
+    Gera pulsos no registrador do sensor e, opcionalmente, simula a leitura do scanner
+    durante o pulso, escrevendo 1 no endereço de confirmação pelo mesmo caminho do
+    LabelManager.process_serial (write_modbus_register_address_async).
+    """
+    def __init__(self, simulator, address_to_monitor, address_read_confirmation,
+                 width_ms=300, period_ms=600, scan_delay_ms=100, read_ratio=1.0, seed=None):
+        self.simulator = simulator
+        self.address_to_monitor = address_to_monitor
+        self.address_read_confirmation = address_read_confirmation
+        self.width = width_ms / 1000.0
+        self.period = period_ms / 1000.0
+        self.scan_delay = min(scan_delay_ms / 1000.0, self.width)
+        self.read_ratio = read_ratio
+        self.random = random.Random(seed)
+
+    def pulse(self):
+        """
+        Gera um pulso e retorna um dicionário com os instantes do pulso e da leitura.
+        """
+        read = self.random.random() < self.read_ratio
+        start = time.perf_counter()
+        self.simulator.set_register(self.address_to_monitor, 1)
+        scan_at = None
+        if read:
+            time.sleep(self.scan_delay)
+            write_modbus_register_address_async(self.address_read_confirmation, 1).result()
+            scan_at = time.perf_counter()
+        time.sleep(max(0.0, start + self.width - time.perf_counter()))
+        self.simulator.set_register(self.address_to_monitor, 0)
+        fall_at = time.perf_counter()
+        time.sleep(max(0.0, start + self.period - time.perf_counter()))
+        return {"start": start, "read": read, "scan_at": scan_at, "fall_at": fall_at}
+
+
+def run_benchmark(pulses=50, width_ms=300, period_ms=600, scan_delay_ms=100, read_ratio=0.8,
+                  poll_interval_ms=None, port=5020, seed=None):
+    """
+    Executa o handshake completo (sensor -> confirmação do scanner -> resultado -> reset)
+    contra o simulador, com o monitoramento real rodando em uma thread.
+
+    Para cada pulso, verifica se o resultado escrito no endereço de escrita é o esperado
+    (0 quando houve leitura, 1 quando não houve) e mede a latência entre o evento que
+    decide o resultado (confirmação ou borda de descida) e a escrita do resultado.
+
+    Retorna um dicionário com o resumo do benchmark.
+    """
+    with PlcSimulator(port=port) as simulator:
+        _, _, _, address_to_monitor, address_to_write, address_read_confirmation = load_modbus_config()
+        for address in (address_to_monitor, address_to_write, address_read_confirmation):
+            simulator.set_register(address, 0)
+
+        stats = ModbusMonitorStats()
+        stop_event = threading.Event()
+        poll_interval = poll_interval_ms / 1000.0 if poll_interval_ms else None
+        poller = ModbusRegisterPoller(poll_interval=poll_interval, stats=stats)
+        monitor = threading.Thread(
+            target=monitor_modbus_input,
+            kwargs={"poller": poller, "stop_event": stop_event, "stats": stats},
+            daemon=True
+        )
+        monitor.start()
+        # Aguarda a primeira leitura do monitoramento (que apenas inicializa o estado)
+        time.sleep(0.3)
+
+        generator = SensorPulseGenerator(simulator, address_to_monitor, address_read_confirmation,
+                                         width_ms=width_ms, period_ms=period_ms,
+                                         scan_delay_ms=scan_delay_ms, read_ratio=read_ratio, seed=seed)
+        results = [generator.pulse() for _ in range(pulses)]
+        time.sleep(max(0.3, period_ms / 1000.0))
+        stop_event.set()
+        monitor.join(timeout=2)
+        poller.stop()
+
+    latencies = []
+    wrong = 0
+    missed = 0
+    for index, pulse in enumerate(results):
+        window_end = results[index + 1]["start"] if index + 1 < len(results) else float("inf")
+        if pulse["read"]:
+            # Instante em que a confirmação chegou ao CLP, registrado pelo próprio servidor
+            confirmations = [ts for ts, value in
+                             simulator.data_bank.writes_to(address_read_confirmation, pulse["start"])
+                             if value == 1 and ts < window_end]
+            decided_at = confirmations[0] if confirmations else pulse["scan_at"]
+        else:
+            decided_at = pulse["fall_at"]
+        writes = [(ts, value) for ts, value in simulator.data_bank.writes_to(address_to_write, decided_at)
+                  if ts < window_end]
+        if not writes:
+            missed += 1
+            continue
+        ts, value = writes[0]
+        if value != (0 if pulse["read"] else 1):
+            wrong += 1
+        latencies.append(ts - decided_at)
+
+    summary = {
+        "pulses": pulses,
+        "read_pulses": sum(1 for pulse in results if pulse["read"]),
+        "missed": missed,
+        "wrong_result": wrong,
+        **window_summary("edge_to_result", latencies),
+        "monitor": stats.summary(),
+    }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Simulador de CLP Modbus TCP para testar o handshake sensor/scanner sem hardware.")
+    parser.add_argument("--pulses", type=int, default=50, help="quantidade de pulsos do sensor")
+    parser.add_argument("--width-ms", type=float, default=300, help="duração de cada pulso")
+    parser.add_argument("--period-ms", type=float, default=600, help="intervalo entre inícios de pulsos")
+    parser.add_argument("--scan-delay-ms", type=float, default=100,
+                        help="atraso da leitura do scanner após o início do pulso")
+    parser.add_argument("--read-ratio", type=float, default=0.8,
+                        help="fração dos pulsos em que o scanner confirma a leitura")
+    parser.add_argument("--poll-interval-ms", type=float, default=None,
+                        help="intervalo de leitura do monitoramento (padrão: config.json)")
+    parser.add_argument("--port", type=int, default=5020, help="porta TCP do simulador")
+    parser.add_argument("--seed", type=int, default=None, help="semente para reprodutibilidade")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    summary = run_benchmark(pulses=args.pulses, width_ms=args.width_ms, period_ms=args.period_ms,
+                            scan_delay_ms=args.scan_delay_ms, read_ratio=args.read_ratio,
+                            poll_interval_ms=args.poll_interval_ms, port=args.port, seed=args.seed)
+    monitor = summary.pop("monitor")
+    for key, value in summary.items():
+        print(f"{key}: {value}")
+    print("monitor:")
+    for key, value in monitor.items():
+        print(f"  {key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,37 @@
 from pyModbusTCP.client import ModbusClient
+from contextlib import contextmanager
+from collections import deque
+from concurrent.futures import Future
+from queue import Queue
+import asyncio
 import logging
 import os
 import json
+import threading
+import time
+import weakref
+
+from latency_stats import ms, window_summary
+
+try:
+    from pyModbusTCP.constants import MB_TIMEOUT_ERR, MB_EXCEPT_ERR
+except ImportError:
+    MB_TIMEOUT_ERR = 5
+    MB_EXCEPT_ERR = 7
 
 _modbus_config = None
+_modbus_settings = {}
+_modbus_config_overrides = {}
 _last_config_time = 0
+_last_config_check = 0.0
+_config_lock = threading.Lock()
+
+# Intervalo mínimo (em segundos) entre verificações do mtime do config.json.
+# Dentro desse intervalo, load_modbus_config() é apenas uma leitura em memória.
+CONFIG_CHECK_INTERVAL = 1.0
+
+# Limite do protocolo Modbus para a função 0x03 (read holding registers)
+MAX_REGISTERS_PER_READ = 125
 
 def resource_path(relative_path: str) -> str:
     """
@@ -21,6 +48,9 @@ def resource_path(relative_path: str) -> str:
 def load_modbus_config():
     """
     Carrega a configuração do Modbus a partir do arquivo config.json.
+
+    O resultado fica em cache: o arquivo só é relido quando seu mtime muda (verificado
+    no máximo a cada CONFIG_CHECK_INTERVAL segundos) ou após invalidate_modbus_config().
     
     Retorna:
         tuple: (host (str), port (int), address (int), address_to_monitor (int),
@@ -29,9 +59,68 @@ def load_modbus_config():
     Observação:
         Essa função espera que o arquivo config.json contenha as chaves relacionadas ao Modbus.
     """
-    config_file = resource_path("config.json")
+    global _modbus_config, _modbus_settings, _last_config_time, _last_config_check
+
+    config = _modbus_config
+    now = time.monotonic()
+    if config is not None and now - _last_config_check < CONFIG_CHECK_INTERVAL:
+        return config
+
+    with _config_lock:
+        config_file = resource_path("config.json")
+        try:
+            mtime = os.path.getmtime(config_file)
+        except OSError:
+            if _modbus_config is not None:
+                return _modbus_config
+            raise
+        if _modbus_config is None or mtime != _last_config_time:
+            new_config, new_settings = _read_modbus_config_file(config_file)
+            if _modbus_config is not None and new_config[:2] != _modbus_config[:2]:
+                # Host/porta mudaram: as conexões persistentes antigas não servem mais
+                _client_pool.close_all()
+            _modbus_config = new_config
+            _modbus_settings = new_settings
+            _last_config_time = mtime
+        _last_config_check = now
+        return _modbus_config
+
+def invalidate_modbus_config():
+    """
+    Descarta a configuração em cache, forçando a releitura do config.json na próxima chamada.
+    Deve ser chamada sempre que o config.json for salvo pela aplicação.
+    """
+    global _last_config_time, _last_config_check
+    with _config_lock:
+        _last_config_time = 0
+        _last_config_check = 0.0
+
+def set_modbus_config_overrides(overrides=None):
+    """
+    Sobrepõe chaves do config.json apenas em memória (ex.: {"modbus_host": "127.0.0.1",
+    "modbus_port": 5020}), útil para apontar o cliente para um servidor de testes.
+    Chamar sem argumentos remove as sobreposições.
+    """
+    global _modbus_config_overrides
+    _modbus_config_overrides = dict(overrides or {})
+    invalidate_modbus_config()
+
+def get_modbus_setting(key, default=None):
+    """
+    Retorna uma chave adicional do config.json (ex.: 'modbus_poll_interval_ms')
+    a partir do mesmo cache usado por load_modbus_config().
+    """
+    load_modbus_config()
+    return _modbus_settings.get(key, default)
+
+def _read_modbus_config_file(config_file):
+    """
+    Lê e interpreta as chaves do Modbus presentes no config.json.
+    Retorna a tupla de load_modbus_config() e o dicionário completo da configuração.
+    """
     with open(config_file, "r", encoding="utf-8") as f:
         config = json.load(f)
+    config.update(_modbus_config_overrides)
     host = config["modbus_host"]
     port = config["modbus_port"]
     address = config.get("modbus_address", 0)  # Caso a chave não exista, usa 0
@@ -41,11 +130,467 @@ def load_modbus_config():
     address_to_write = config.get("modbus_address_to_write", 2)  # Padrão: 2
     address_read_confirmation = config.get("modbus_address_read_confirmation", 3)  # Padrão: 3
     
-    return host, port, address, address_to_monitor, address_to_write, address_read_confirmation
+    return (host, port, address, address_to_monitor, address_to_write, address_read_confirmation), config
+
+class LatencyHistogram:
+    """
+    Histograma de latências no estilo HDR: os valores (em microssegundos) são agrupados em
+    buckets log-lineares, com 16 sub-buckets lineares por potência de 2. O erro relativo
+    de cada percentil fica abaixo de ~6%, com memória constante independente do volume.
+    """
+    SUB_BUCKET_BITS = 4
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total_us = 0
+        self.max_us = 0
+
+    def _bucket(self, value_us):
+        shift = max(0, value_us.bit_length() - (self.SUB_BUCKET_BITS + 1))
+        return shift, value_us >> shift
+
+    def record(self, seconds):
+        value_us = max(0, int(seconds * 1_000_000))
+        key = self._bucket(value_us)
+        self.counts[key] = self.counts.get(key, 0) + 1
+        self.count += 1
+        self.total_us += value_us
+        self.max_us = max(self.max_us, value_us)
+
+    def percentile(self, percent):
+        """
+        Retorna o percentil (0-100) em milissegundos (limite superior do bucket), ou None se vazio.
+        """
+        if not self.count:
+            return None
+        target = max(1, int(round(percent / 100.0 * self.count)))
+        seen = 0
+        for shift, mantissa in sorted(self.counts, key=lambda k: k[1] << k[0]):
+            seen += self.counts[(shift, mantissa)]
+            if seen >= target:
+                upper_us = ((mantissa + 1) << shift) - 1
+                return round(min(upper_us, self.max_us) / 1000.0, 3)
+        return round(self.max_us / 1000.0, 3)
+
+class ModbusMetrics:
+    """
+    Métricas das operações Modbus: histogramas de latência por (operação, endereço)
+    e contadores de timeouts, erros e reconexões.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._operations = {}
+        self.connects = 0
+        self.reconnects = 0
+        self.rejected = 0
+
+    def record(self, operation, address, seconds, ok, timeout=False):
+        with self._lock:
+            entry = self._operations.get((operation, address))
+            if entry is None:
+                entry = {"histogram": LatencyHistogram(), "errors": 0, "timeouts": 0}
+                self._operations[(operation, address)] = entry
+            entry["histogram"].record(seconds)
+            if not ok:
+                entry["errors"] += 1
+            if timeout:
+                entry["timeouts"] += 1
+
+    def record_connect(self, reconnect):
+        with self._lock:
+            if reconnect:
+                self.reconnects += 1
+            else:
+                self.connects += 1
+
+    def record_rejected(self):
+        with self._lock:
+            self.rejected += 1
+
+    def snapshot(self):
+        """
+        Retorna um dicionário com os contadores e, por operação/endereço,
+        quantidade, erros, timeouts e percentis de latência (ms).
+        """
+        with self._lock:
+            operations = []
+            for (operation, address), entry in sorted(self._operations.items(), key=lambda item: (item[0][0], item[0][1])):
+                histogram = entry["histogram"]
+                operations.append({
+                    "operation": operation,
+                    "address": address,
+                    "count": histogram.count,
+                    "errors": entry["errors"],
+                    "timeouts": entry["timeouts"],
+                    "p50_ms": histogram.percentile(50),
+                    "p95_ms": histogram.percentile(95),
+                    "p99_ms": histogram.percentile(99),
+                    "max_ms": round(histogram.max_us / 1000.0, 3),
+                })
+            return {
+                "operations": operations,
+                "errors": sum(op["errors"] for op in operations),
+                "timeouts": sum(op["timeouts"] for op in operations),
+                "connects": self.connects,
+                "reconnects": self.reconnects,
+                "rejected": self.rejected,
+                "breakers": _client_pool.breaker_states(),
+            }
+
+    def reset(self):
+        with self._lock:
+            self._operations = {}
+            self.connects = 0
+            self.reconnects = 0
+            self.rejected = 0
+
+_metrics = ModbusMetrics()
+
+def get_modbus_metrics():
+    """
+    Retorna o snapshot das métricas de latência e erros das operações Modbus.
+    """
+    return _metrics.snapshot()
+
+BREAKER_CLOSED = "closed"
+BREAKER_OPEN = "open"
+BREAKER_HALF_OPEN = "half-open"
+
+class CircuitBreaker:
+    """
+    Circuit breaker da conexão com um CLP.
+
+    - closed: as chamadas passam normalmente; após 'failure_threshold' falhas de
+      comunicação consecutivas o circuito abre;
+    - open: as chamadas falham imediatamente (sem tentar conectar) até o fim do backoff;
+    - half-open: terminado o backoff, uma única chamada de teste é liberada. Se ela
+      funcionar, o circuito fecha; se falhar, reabre com o backoff dobrado (até 'max_backoff').
+    """
+    def __init__(self, failure_threshold=3, base_backoff=0.5, max_backoff=30.0):
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._lock = threading.Lock()
+        self.state = BREAKER_CLOSED
+        self.failures = 0
+        self.backoff = base_backoff
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+
+    def allow(self):
+        """
+        Retorna True se a chamada pode ser feita agora.
+        """
+        with self._lock:
+            if self.state == BREAKER_CLOSED:
+                return True
+            if self.state == BREAKER_OPEN:
+                if time.monotonic() - self.opened_at < self.backoff:
+                    return False
+                self.state = BREAKER_HALF_OPEN
+                self._trial_in_flight = False
+            if self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self.state != BREAKER_CLOSED:
+                logging.info("Comunicação com o CLP restabelecida; circuito fechado.")
+            self.state = BREAKER_CLOSED
+            self.failures = 0
+            self.backoff = self.base_backoff
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == BREAKER_HALF_OPEN:
+                self.backoff = min(self.backoff * 2, self.max_backoff)
+            elif self.state == BREAKER_CLOSED and self.failures < self.failure_threshold:
+                return
+            if self.state == BREAKER_CLOSED:
+                logging.warning(f"CLP sem resposta após {self.failures} falhas; circuito aberto por {self.backoff:.1f} s.")
+            self.state = BREAKER_OPEN
+            self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+class _HostConnectionPool:
+    """
+    Conjunto de conexões persistentes para um único par (host, porta, unit_id).
+    Cada conexão é emprestada a uma thread por vez, pois o ModbusClient não é thread-safe.
+    """
+    def __init__(self, host, port, unit_id, max_connections):
+        self.host = host
+        self.port = port
+        self.unit_id = unit_id
+        self.max_connections = max_connections
+        self._condition = threading.Condition()
+        self._idle = []
+        self._all = []
+
+    def acquire(self):
+        timeout = get_modbus_setting("modbus_timeout_s", 1.0)
+        with self._condition:
+            while not self._idle and len(self._all) >= self.max_connections:
+                self._condition.wait()
+            if self._idle:
+                return self._idle.pop()
+            # auto_open reabre o socket automaticamente na próxima requisição caso ele tenha caído
+            client = ModbusClient(host=self.host, port=self.port, unit_id=self.unit_id,
+                                  timeout=timeout,
+                                  auto_open=True, auto_close=False)
+            self._all.append(client)
+            return client
+
+    def release(self, client):
+        with self._condition:
+            self._idle.append(client)
+            self._condition.notify()
+
+    def close_all(self):
+        with self._condition:
+            for client in self._all:
+                try:
+                    client.close()
+                except Exception:
+                    pass
+
+class ModbusClientPool:
+    """
+    Gerenciador de conexões Modbus TCP persistentes e thread-safe.
+
+    Mantém um pool de conexões por (host, porta, unit_id), evitando abrir e fechar uma
+    conexão TCP a cada leitura/escrita. No regime permanente, o loop de monitoramento
+    reutiliza sempre a mesma conexão.
+    """
+    def __init__(self, max_connections_per_host=2):
+        self.max_connections_per_host = max_connections_per_host
+        self._lock = threading.Lock()
+        self._pools = {}
+        self._breakers = {}
+        self._connected_clients = weakref.WeakSet()
+
+    def _get_host_pool(self, host, port, unit_id):
+        key = (host, port, unit_id)
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = _HostConnectionPool(host, port, unit_id, self.max_connections_per_host)
+                self._pools[key] = pool
+            return pool
+
+    def _get_breaker(self, host, port):
+        key = (host, port)
+        with self._lock:
+            breaker = self._breakers.get(key)
+        if breaker is not None:
+            return breaker
+        # As configurações são lidas fora do lock: load_modbus_config() pode chamar close_all()
+        breaker = CircuitBreaker(
+            failure_threshold=get_modbus_setting("modbus_breaker_failures", 3),
+            base_backoff=get_modbus_setting("modbus_reconnect_backoff_s", 0.5),
+            max_backoff=get_modbus_setting("modbus_reconnect_backoff_max_s", 30.0)
+        )
+        with self._lock:
+            return self._breakers.setdefault(key, breaker)
+
+    def breaker_states(self):
+        """
+        Retorna o estado do circuit breaker de cada CLP, no formato {"host:porta": estado}.
+        """
+        with self._lock:
+            return {f"{host}:{port}": breaker.state for (host, port), breaker in self._breakers.items()}
+
+    @contextmanager
+    def connection(self, host, port, unit_id=1):
+        """
+        Empresta uma conexão do pool durante o bloco 'with'.
+        """
+        pool = self._get_host_pool(host, port, unit_id)
+        client = pool.acquire()
+        try:
+            yield client
+        finally:
+            pool.release(client)
+
+    def execute(self, host, port, operation, *args, unit_id=1):
+        """
+        Executa um método do ModbusClient (ex.: 'read_holding_registers') com reconexão transparente.
+
+        Se a operação falhar em um socket que estava aberto, a conexão é fechada e a operação
+        é repetida uma única vez, o que cobre o caso de sockets encerrados pelo CLP enquanto
+        estavam ociosos.
+
+        Enquanto o circuit breaker do CLP estiver aberto, a chamada retorna None imediatamente,
+        sem tentar conectar. Respostas de exceção do próprio CLP não contam como falha de comunicação.
+
+        A latência de cada chamada (incluindo a repetição), os erros, timeouts e
+        reconexões são registrados em get_modbus_metrics().
+        """
+        breaker = self._get_breaker(host, port)
+        if not breaker.allow():
+            _metrics.record_rejected()
+            return None
+
+        address = args[0] if args else None
+        started_at = time.perf_counter()
+        timeout = False
+        result = None
+        reachable = False
+        try:
+            with self.connection(host, port, unit_id) as client:
+                was_open = client.is_open
+                result = self._call(client, operation, args)
+                timeout = _last_error(client) == MB_TIMEOUT_ERR
+                if (result is None or result is False) and was_open and _last_error(client) != MB_EXCEPT_ERR:
+                    client.close()
+                    result = self._call(client, operation, args)
+                    timeout = timeout or _last_error(client) == MB_TIMEOUT_ERR
+                reachable = (result is not None and result is not False) or _last_error(client) == MB_EXCEPT_ERR
+                return result
+        finally:
+            if reachable:
+                breaker.record_success()
+            else:
+                breaker.record_failure()
+            ok = result is not None and result is not False
+            _metrics.record(_operation_name(operation), address, time.perf_counter() - started_at, ok, timeout)
+
+    def _call(self, client, operation, args):
+        if not client.is_open:
+            _metrics.record_connect(reconnect=client in self._connected_clients)
+            self._connected_clients.add(client)
+        return getattr(client, operation)(*args)
+
+    def close_all(self):
+        """
+        Fecha todas as conexões abertas (ex.: após alteração de host/porta na configuração).
+        """
+        with self._lock:
+            pools = list(self._pools.values())
+            self._pools = {}
+        for pool in pools:
+            pool.close_all()
+
+def _last_error(client):
+    # last_error é uma propriedade a partir do pyModbusTCP 0.2 e um método nas versões anteriores
+    error = getattr(client, "last_error", None)
+    return error() if callable(error) else error
+
+def _operation_name(operation):
+    return {"read_holding_registers": "read", "write_single_register": "write"}.get(operation, operation)
+
+_client_pool = ModbusClientPool()
+
+def get_modbus_client_pool():
+    """
+    Retorna o gerenciador de conexões Modbus compartilhado pelo processo.
+    """
+    return _client_pool
+
+class ShadowRegisters:
+    """
+    Registradores-sombra: guarda o último valor escrito em cada endereço e suprime
+    escritas redundantes, de modo que o tráfego de escrita acompanhe as mudanças de
+    estado e não a quantidade de verificações.
+
+    Para CLPs que precisam de "heartbeat", um valor igual ao da sombra volta a ser
+    escrito quando a última escrita for mais antiga que 'modbus_shadow_refresh_s'
+    (config.json; 0 desativa o reenvio periódico). Valores lidos do CLP atualizam a
+    sombra, para que alterações feitas pelo próprio CLP não sejam mascaradas.
+
+    Cada registrador (host, porta, endereço) tem seu próprio lock, mantido durante a
+    verificação, a escrita no CLP e a atualização da sombra: duas escritas simultâneas no
+    mesmo endereço são serializadas, e nenhuma é suprimida com base em um valor que outra
+    thread está alterando. Escritas em endereços diferentes não se bloqueiam.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {}
+        self._key_locks = {}
+        self.written = 0
+        self.suppressed = 0
+
+    def _key_lock(self, key):
+        with self._lock:
+            lock = self._key_locks.get(key)
+            if lock is None:
+                lock = self._key_locks[key] = threading.Lock()
+            return lock
+
+    def _refresh_interval(self):
+        return float(get_modbus_setting("modbus_shadow_refresh_s", 5.0))
+
+    def write(self, address, value, force=False):
+        """
+        Escreve o valor caso ele seja diferente do valor na sombra (ou caso o reenvio
+        periódico esteja vencido, ou force=True).
+
+        Retorna:
+            True/False conforme o resultado da escrita, ou None se a escrita foi suprimida.
+        """
+        host, port, _, _, _, _ = load_modbus_config()
+        key = (host, port, address)
+        refresh_interval = self._refresh_interval()
+        with self._key_lock(key):
+            now = time.monotonic()
+            with self._lock:
+                last = self._values.get(key)
+                if (not force and last is not None and last[0] == value
+                        and (refresh_interval <= 0 or now - last[1] < refresh_interval)):
+                    self.suppressed += 1
+                    return None
+            result = bool(_client_pool.execute(host, port, "write_single_register", address, value))
+            with self._lock:
+                if result:
+                    self.written += 1
+                    self._values[key] = (value, now)
+                else:
+                    # Estado do CLP desconhecido: a próxima escrita não pode ser suprimida
+                    self._values.pop(key, None)
+            return result
+
+    def record(self, address, value):
+        """
+        Registra na sombra um valor escrito diretamente (fora desta camada).
+        """
+        host, port, _, _, _, _ = load_modbus_config()
+        key = (host, port, address)
+        with self._key_lock(key):
+            with self._lock:
+                self._values[key] = (value, time.monotonic())
+
+    def observe(self, values):
+        """
+        Confronta a sombra com valores lidos do CLP ({endereço: valor}); endereços
+        cujo valor real diverge da sombra são descartados dela.
+        """
+        host, port, _, _, _, _ = load_modbus_config()
+        with self._lock:
+            for address, value in values.items():
+                last = self._values.get((host, port, address))
+                if last is not None and last[0] != value:
+                    del self._values[(host, port, address)]
+
+    def invalidate(self):
+        with self._lock:
+            self._values.clear()
+
+_shadow_registers = ShadowRegisters()
+
+def get_shadow_registers():
+    """
+    Retorna a camada de registradores-sombra compartilhada pelo processo.
+    """
+    return _shadow_registers
 
 def write_modbus_register(status):
     """
     Escreve um valor de status em um registrador Modbus.
+    Escritas de um valor idêntico ao último escrito são suprimidas (ver ShadowRegisters).
 
     Parâmetros:
         status (str): Deve ser 'OK' ou 'NG'.
@@ -71,23 +616,17 @@ def write_modbus_register(status):
     # Carrega as configurações do Modbus (host, port e address) a partir do arquivo JSON
     host, port, address, _, _, _ = load_modbus_config()
     
-    # Cria e configura o cliente Modbus TCP
-    client = ModbusClient(host=host, port=port, unit_id=1, auto_open=True)
-    
-    if not client.is_open:
-        if not client.open():
-            logging.error("Falha ao conectar no servidor Modbus TCP")
-            return False
-
-    # Usa o endereço configurado a partir do config.json
-    if not client.write_single_register(address, value):
+    # Usa o endereço configurado a partir do config.json, através da conexão persistente
+    result = _shadow_registers.write(address, value)
+    if result is None:
+        # O registrador já contém esse valor: nada a escrever
+        return True
+    if not result:
         logging.error("Erro ao escrever no registrador!")
-        client.close()
         return False
     else:
         logging.info(f"Valor {value} escrito com sucesso no endereço {address}.")
     
-    client.close()
     return True
 
 def read_modbus_register(address):
@@ -105,22 +644,14 @@ def read_modbus_register(address):
     # Carrega as configurações do Modbus (host, port) a partir do arquivo JSON
     host, port, _, _, _, _ = load_modbus_config()
     
-    # Cria e configura o cliente Modbus TCP
-    client = ModbusClient(host=host, port=port, unit_id=1, auto_open=True)
-    
-    if not client.is_open:
-        if not client.open():
-            logging.error("Falha ao conectar no servidor Modbus TCP")
-            return None
-
-    # Tenta ler o registrador
-    value = client.read_holding_registers(address, 1)
-    client.close()
+    # Tenta ler o registrador através da conexão persistente
+    value = _client_pool.execute(host, port, "read_holding_registers", address, 1)
     
     if value is None:
         logging.error(f"Erro ao ler o registrador do endereço {address}!")
         return None
     
+    _shadow_registers.observe({address: value[0]})
     logging.info(f"Valor {value[0]} lido com sucesso do endereço {address}.")
     return value[0]
 
@@ -140,108 +671,497 @@ def write_modbus_register_address(address, value):
     # Carrega as configurações do Modbus (host, port) a partir do arquivo JSON
     host, port, _, _, _, _ = load_modbus_config()
     
-    # Cria e configura o cliente Modbus TCP
-    client = ModbusClient(host=host, port=port, unit_id=1, auto_open=True)
-    
-    if not client.is_open:
-        if not client.open():
-            logging.error("Falha ao conectar no servidor Modbus TCP")
-            return False
-
-    if not client.write_single_register(address, value):
+    if not _client_pool.execute(host, port, "write_single_register", address, value):
         logging.error(f"Erro ao escrever o valor {value} no registrador {address}!")
-        client.close()
         return False
     else:
+        _shadow_registers.record(address, value)
         logging.info(f"Valor {value} escrito com sucesso no endereço {address}.")
     
-    client.close()
     return True
 
-def monitor_modbus_input(**kwargs):
+class ModbusWriteQueue:
+    """
+    Fila ordenada de escritas Modbus, processada por uma única thread em segundo plano.
+
+    submit() retorna imediatamente um concurrent.futures.Future com o resultado da escrita,
+    de modo que o chamador (ex.: o processamento de um scan) não espera pela rede. As escritas
+    são executadas na ordem de submissão. O tempo em fila e o tempo de escrita são medidos
+    separadamente.
+    """
+    def __init__(self, window=2000):
+        self._queue = Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.completed = 0
+        self.failed = 0
+        self._wait_times = deque(maxlen=window)
+        self._service_times = deque(maxlen=window)
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._worker, daemon=True)
+                self._thread.start()
+
+    def submit(self, func, *args):
+        """
+        Enfileira a chamada func(*args) e retorna o Future do seu resultado.
+        """
+        future = Future()
+        self._queue.put((time.perf_counter(), future, func, args))
+        self._ensure_worker()
+        return future
+
+    def _worker(self):
+        while True:
+            enqueued_at, future, func, args = self._queue.get()
+            try:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                started_at = time.perf_counter()
+                try:
+                    result = func(*args)
+                except Exception as e:
+                    future.set_exception(e)
+                    result = False
+                else:
+                    future.set_result(result)
+                finished_at = time.perf_counter()
+                with self._lock:
+                    self._wait_times.append(started_at - enqueued_at)
+                    self._service_times.append(finished_at - started_at)
+                    if result is False:
+                        self.failed += 1
+                    else:
+                        self.completed += 1
+            finally:
+                self._queue.task_done()
+
+    def summary(self):
+        """
+        Retorna as métricas da fila (tempos em milissegundos).
+        """
+        with self._lock:
+            wait_times = list(self._wait_times)
+            service_times = list(self._service_times)
+            completed = self.completed
+            failed = self.failed
+
+        return {
+            "pending": self._queue.qsize(),
+            "completed": completed,
+            "failed": failed,
+            **window_summary("queue_wait", wait_times),
+            **window_summary("write", service_times),
+        }
+
+_write_queue = ModbusWriteQueue()
+
+def get_write_queue_stats():
+    """
+    Retorna as métricas da fila de escritas assíncronas.
+    """
+    return _write_queue.summary()
+
+def write_modbus_register_async(status):
+    """
+    Versão não bloqueante de write_modbus_register: enfileira a escrita do status ('OK'/'NG')
+    e retorna um Future com o resultado (bool).
+    """
+    return _write_queue.submit(write_modbus_register, status)
+
+def write_modbus_register_address_async(address, value):
+    """
+    Versão não bloqueante de write_modbus_register_address: enfileira a escrita e retorna
+    um Future com o resultado (bool).
+    """
+    return _write_queue.submit(write_modbus_register_address, address, value)
+
+def _register_spans(addresses):
+    """
+    Agrupa endereços ordenados em faixas contínuas (início, quantidade) de até
+    MAX_REGISTERS_PER_READ registradores, uma faixa por requisição.
     """
-    Monitora continuamente um endereço Modbus e executa ações com base na mudança de estado.
-    Registra no log apenas mudanças de estado e eventos importantes.
+    spans = []
+    for address in addresses:
+        if spans and address - spans[-1][0] < MAX_REGISTERS_PER_READ:
+            spans[-1][1] = address - spans[-1][0] + 1
+        else:
+            spans.append([address, 1])
+    return [tuple(span) for span in spans]
+
+def read_modbus_registers(addresses):
+    """
+    Lê vários registradores Modbus em uma única requisição read_holding_registers,
+    cobrindo a faixa entre o menor e o maior endereço informado.
+
+    Parâmetros:
+        addresses (iterable[int]): Endereços a serem lidos.
+
+    Retorna:
+        dict: {endereço: valor} ou None em caso de erro.
+    """
+    addresses = sorted(set(addresses))
+    if not addresses:
+        return {}
+
+    host, port, _, _, _, _ = load_modbus_config()
     
-    NOVA LÓGICA:
+    try:
+        values = {}
+        for start, count in _register_spans(addresses):
+            block = _client_pool.execute(host, port, "read_holding_registers", start, count)
+            if block is None or len(block) < count:
+                return None
+            for address in addresses:
+                if start <= address < start + count:
+                    values[address] = block[address - start]
+        _shadow_registers.observe(values)
+        return values
+    except Exception:
+        return None
+
+class ModbusMonitorStats:
+    """
+    Estatísticas do monitoramento Modbus: jitter do intervalo entre leituras
+    e latência entre a detecção de uma borda e a conclusão da escrita correspondente.
+    Mantém apenas as últimas 'window' amostras de cada métrica.
+    """
+    def __init__(self, window=2000):
+        self._lock = threading.Lock()
+        self.target_interval = None
+        self.polls = 0
+        self.overruns = 0
+        self._intervals = deque(maxlen=window)
+        self._jitter = deque(maxlen=window)
+        self._edge_to_write = deque(maxlen=window)
+
+    def record_interval(self, interval, target_interval):
+        with self._lock:
+            self.target_interval = target_interval
+            self.polls += 1
+            self._intervals.append(interval)
+            self._jitter.append(abs(interval - target_interval))
+
+    def record_overrun(self):
+        with self._lock:
+            self.overruns += 1
+
+    def record_edge_to_write(self, latency):
+        with self._lock:
+            self._edge_to_write.append(latency)
+
+    def summary(self):
+        """
+        Retorna um dicionário com as métricas agregadas (tempos em milissegundos).
+        """
+        with self._lock:
+            intervals = list(self._intervals)
+            jitter = list(self._jitter)
+            edge_to_write = list(self._edge_to_write)
+            polls = self.polls
+            overruns = self.overruns
+            target_interval = self.target_interval
+
+        return {
+            "polls": polls,
+            "overruns": overruns,
+            "target_interval_ms": ms(target_interval),
+            "interval_mean_ms": ms(sum(intervals) / len(intervals)) if intervals else None,
+            **window_summary("jitter", jitter),
+            "edge_to_write_count": len(edge_to_write),
+            **window_summary("edge_to_write", edge_to_write),
+        }
+
+_monitor_stats = ModbusMonitorStats()
+
+def get_monitor_stats():
+    """
+    Retorna o resumo das estatísticas do monitoramento Modbus em execução.
+    """
+    return _monitor_stats.summary()
+
+class SensorStateMachine:
+    """
+    Máquina de estados do handshake sensor/confirmação:
+
     - Quando o endereço de monitoramento muda para valor 1: começa a verificar o endereço de confirmação
     - Se o endereço de confirmação tiver valor 1: significa que foi feita uma leitura, então escreve 0 no endereço de escrita
     - Se o endereço de monitoramento voltar para 0 e o endereço de confirmação não tiver valor 1: escreve 1 no endereço de escrita
     - Sempre que o endereço de monitoramento mudar para 0: resetar o endereço de confirmação para 0
+    """
+    def __init__(self, address_to_monitor, address_to_write, address_read_confirmation, stats=None):
+        self.address_to_monitor = address_to_monitor
+        self.address_to_write = address_to_write
+        self.address_read_confirmation = address_read_confirmation
+        self.stats = stats
+        self.last_value = None  # Inicializa como None para forçar leitura inicial sem log
+        self.first_run = True
+        self.read_confirmed = False  # Flag para controlar se a leitura foi confirmada
+
+    def _write(self, address, value, detected_at):
+        result = write_modbus_register_silent(address, value)
+        if self.stats is not None:
+            self.stats.record_edge_to_write(time.perf_counter() - detected_at)
+        return result
+
+    def prime(self, values):
+        """
+        Inicializa o último valor do sensor a partir de uma imagem já existente dos registradores.
+        """
+        if self.first_run and values and values.get(self.address_to_monitor) is not None:
+            self.last_value = values[self.address_to_monitor]
+            self.first_run = False
+
+    def update(self, values, detected_at):
+        """
+        Processa os valores lidos em um ciclo.
+
+        Parâmetros:
+            values (dict): {endereço: valor} lidos no ciclo, ou None em caso de falha na leitura.
+            detected_at (float): instante (time.perf_counter) em que a leitura foi concluída.
+        """
+        current_value = values.get(self.address_to_monitor) if values is not None else None
+        if current_value is None:
+            return
+
+        # Na primeira execução, apenas atualiza o valor sem logar
+        if self.first_run:
+            self.last_value = current_value
+            self.first_run = False
+            return
+
+        # Se o valor mudou de 0 para 1, inicia o processo de monitoramento do endereço de confirmação
+        if current_value == 1 and self.last_value == 0:
+            logging.info(f"Mudança detectada no endereço {self.address_to_monitor}: valor mudou para 1 (ativo)")
+            
+            # Reinicia a flag para nova tentativa
+            self.read_confirmed = False
+        
+        # Enquanto o sensor estiver ativo (valor 1), verifica o endereço de confirmação de leitura
+        if current_value == 1:
+            # Verifica se já houve confirmação de leitura no endereço de confirmação
+            if not self.read_confirmed and values.get(self.address_read_confirmation) == 1:
+                self.read_confirmed = True
+                # Se a leitura foi confirmada, escreve 0 no endereço de resultado
+                self._write(self.address_to_write, 0, detected_at)
+                logging.info(f"Leitura confirmada no endereço {self.address_read_confirmation}. "
+                             f"Escrito 0 no endereço {self.address_to_write}.")
+        
+        # Se o valor mudou de 1 para 0, verifica se houve confirmação de leitura
+        elif current_value == 0 and self.last_value == 1:
+            logging.info(f"Mudança detectada no endereço {self.address_to_monitor}: valor voltou para 0 (inativo)")
+            
+            # Se não houve confirmação de leitura, escreve 1 no endereço de resultado
+            if not self.read_confirmed:
+                self._write(self.address_to_write, 1, detected_at)
+                logging.info(f"Nenhuma leitura confirmada enquanto o sensor estava ativo. "
+                             f"Escrito 1 no endereço {self.address_to_write}.")
+            
+            # SEMPRE após o sensor desativar, reseta o endereço de confirmação de leitura para 0
+            if write_modbus_register_silent(self.address_read_confirmation, 0):
+                logging.info(f"Resetado endereço {self.address_read_confirmation} para 0 após sensor desativar.")
+            else:
+                logging.error(f"Falha ao resetar endereço {self.address_read_confirmation} para 0.")
+        
+        # Atualiza o último valor lido
+        self.last_value = current_value
+
+class ModbusRegisterPoller:
+    """
+    Poller único dos registradores Modbus do processo.
+
+    Lê, em uma única requisição por ciclo, todos os endereços configurados (status da
+    impressora, sensor, resultado e confirmação), mantém a imagem atual dos registradores
+    e publica eventos de mudança para os assinantes. O monitoramento do sensor e os alertas
+    da interface consomem esses eventos em vez de fazer suas próprias leituras.
+
+    O ciclo segue uma grade fixa baseada em asyncio (t0, t0 + intervalo, t0 + 2*intervalo, ...),
+    de modo que o tempo gasto na própria leitura não acumula deriva. Se um ciclo atrasar mais
+    que um intervalo inteiro (ex.: reconexão lenta), a grade é reiniciada em vez de disparar
+    leituras em rajada. As operações Modbus (bloqueantes) rodam em uma thread auxiliar.
+    """
+    def __init__(self, poll_interval=None, stats=None):
+        """
+        Parâmetros:
+            poll_interval (float): intervalo entre leituras em segundos. Padrão: chave
+                'modbus_poll_interval_ms' do config.json (50 ms).
+            stats (ModbusMonitorStats): destino das métricas de jitter (padrão: get_monitor_stats()).
+        """
+        self.poll_interval = poll_interval
+        self.stats = stats if stats is not None else _monitor_stats
+        self._lock = threading.Lock()
+        self._subscribers = []
+        self._values = {}
+        self._values_time = 0.0
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    def subscribe(self, callback, addresses=None):
+        """
+        Registra um assinante. O callback é chamado na thread do poller como
+        callback(changes, values, detected_at), em que changes é {endereço: (antigo, novo)},
+        values é a imagem completa do ciclo e detected_at é o time.perf_counter() da leitura.
+        Se 'addresses' for informado, o callback só é chamado quando algum desses endereços mudar.
+        O callback deve ser rápido; trabalho pesado deve ser repassado a outra thread.
+        """
+        with self._lock:
+            self._subscribers.append((callback, frozenset(addresses) if addresses is not None else None))
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            self._subscribers = [(cb, addrs) for cb, addrs in self._subscribers if cb is not callback]
+
+    def get_values(self, addresses=None, max_age=None):
+        """
+        Retorna a imagem atual dos registradores ({endereço: valor}) sem acessar o CLP.
+        Retorna None se algum dos endereços pedidos não estiver na imagem ou se ela for
+        mais antiga que max_age segundos.
+        """
+        with self._lock:
+            if max_age is not None and time.monotonic() - self._values_time > max_age:
+                return None
+            if addresses is None:
+                return dict(self._values)
+            if any(address not in self._values for address in addresses):
+                return None
+            return {address: self._values[address] for address in addresses}
+
+    def poll_once(self):
+        """
+        Executa um ciclo de leitura e publica as mudanças detectadas.
+        """
+        _, _, address, address_to_monitor, address_to_write, address_read_confirmation = load_modbus_config()
+        values = read_modbus_registers((address, address_to_monitor, address_to_write, address_read_confirmation))
+        detected_at = time.perf_counter()
+        if values is None:
+            return
+        with self._lock:
+            previous = self._values
+            self._values = values
+            self._values_time = time.monotonic()
+            subscribers = list(self._subscribers)
+        changes = {addr: (previous.get(addr), value) for addr, value in values.items()
+                   if previous.get(addr) != value}
+        if not changes:
+            return
+        for callback, addresses in subscribers:
+            if addresses is not None and addresses.isdisjoint(changes):
+                continue
+            try:
+                callback(changes, values, detected_at)
+            except Exception as e:
+                logging.error(f"Erro em assinante do monitoramento Modbus: {e}")
+
+    async def run_async(self, stop_event=None):
+        """
+        Loop de leitura em taxa fixa; encerra quando stop_event for sinalizado.
+        """
+        poll_interval = self.poll_interval
+        if poll_interval is None:
+            poll_interval = get_modbus_setting("modbus_poll_interval_ms", 50) / 1000.0
+        stop_event = stop_event or self._stop_event
+
+        loop = asyncio.get_running_loop()
+        next_deadline = loop.time()
+        last_poll = None
+
+        while not stop_event.is_set():
+            poll_start = loop.time()
+            if last_poll is not None:
+                self.stats.record_interval(poll_start - last_poll, poll_interval)
+            last_poll = poll_start
+            try:
+                await asyncio.to_thread(self.poll_once)
+            except Exception as e:
+                logging.error(f"Erro durante o monitoramento Modbus: {e}")
+                await asyncio.sleep(1)  # Espera um pouco antes de tentar novamente
+                next_deadline = loop.time()
+                last_poll = None
+                continue
+
+            next_deadline += poll_interval
+            delay = next_deadline - loop.time()
+            if delay < -poll_interval:
+                self.stats.record_overrun()
+                next_deadline = loop.time()
+                delay = 0
+            await asyncio.sleep(max(0.0, delay))
+
+    def start(self):
+        """
+        Inicia o poller em uma thread própria (chamadas repetidas não criam novas threads).
+        """
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=lambda: asyncio.run(self.run_async()), daemon=True)
+            self._thread.start()
+        logging.info("Poller de registradores Modbus iniciado")
+
+    def stop(self, timeout=2):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+_register_poller = ModbusRegisterPoller()
+
+def get_register_poller():
+    """
+    Retorna o poller de registradores compartilhado pelo processo.
+    """
+    return _register_poller
+
+def get_cached_registers(addresses, max_age=1.0):
+    """
+    Retorna os valores dos endereços a partir da imagem do poller, sem acessar o CLP.
+    Retorna None se algum endereço não estiver na imagem ou se ela for
+    mais antiga que max_age segundos.
+    """
+    return _register_poller.get_values(addresses, max_age=max_age)
+
+def monitor_modbus_input(**kwargs):
+    """
+    Monitora continuamente o endereço do sensor e executa ações com base na mudança de estado
+    (ver SensorStateMachine). Registra no log apenas mudanças de estado e eventos importantes.
     
-    Os endereços são carregados do arquivo config.json.
+    Os endereços são carregados do arquivo config.json. A máquina de estados assina os eventos
+    do poller de registradores (iniciado aqui, se necessário); esta função bloqueia a thread
+    chamadora até que stop_event seja sinalizado.
     
-    Parâmetros (ignorados, mantidos para compatibilidade):
-        **kwargs: Quaisquer parâmetros nomeados são ignorados, pois os valores são carregados da configuração.
+    Parâmetros:
+        poller (ModbusRegisterPoller, opcional): poller a ser usado (padrão: get_register_poller()).
+        stop_event (threading.Event, opcional): encerra o monitoramento quando sinalizado.
+        stats (ModbusMonitorStats, opcional): destino das métricas de latência (padrão: get_monitor_stats()).
+        **kwargs: Demais parâmetros nomeados são ignorados, pois os valores são carregados da configuração.
     """
-    import time
-    
+    poller = kwargs.get("poller") or _register_poller
+    stop_event = kwargs.get("stop_event") or threading.Event()
+    stats = kwargs.get("stats") or _monitor_stats
+
     # Carrega os endereços a partir do arquivo de configuração
     _, _, _, address_to_monitor, address_to_write, address_read_confirmation = load_modbus_config()
     
     logging.info(f"Monitorando Modbus: Endereço de sensor: {address_to_monitor}, "
                  f"Endereço de escrita: {address_to_write}, "
                  f"Endereço de confirmação: {address_read_confirmation}")
-    
-    last_value = None  # Inicializa como None para forçar leitura inicial sem log
-    first_run = True
-    read_confirmed = False  # Flag para controlar se a leitura foi confirmada
-    
-    while True:
-        try:
-            # Lê o registrador do sensor (sem logar a cada leitura)
-            current_value = read_modbus_register_silent(address_to_monitor)
-            
-            # Na primeira execução, apenas atualiza o valor sem logar
-            if first_run and current_value is not None:
-                last_value = current_value
-                first_run = False
-                continue
-            
-            # Se o valor mudou de 0 para 1, inicia o processo de monitoramento do endereço de confirmação
-            if current_value is not None and current_value == 1 and last_value == 0:
-                logging.info(f"Mudança detectada no endereço {address_to_monitor}: valor mudou para 1 (ativo)")
-                
-                # Reinicia a flag para nova tentativa
-                read_confirmed = False
-            
-            # Enquanto o sensor estiver ativo (valor 1), verifica o endereço de confirmação de leitura
-            if current_value is not None and current_value == 1:
-                # Verifica se já houve confirmação de leitura no endereço de confirmação
-                if not read_confirmed:
-                    read_status = read_modbus_register_silent(address_read_confirmation)
-                    if read_status == 1:
-                        read_confirmed = True
-                        # Se a leitura foi confirmada, escreve 0 no endereço de resultado
-                        write_modbus_register_silent(address_to_write, 0)
-                        logging.info(f"Leitura confirmada no endereço {address_read_confirmation}. Escrito 0 no endereço {address_to_write}.")
-            
-            # Se o valor mudou de 1 para 0, verifica se houve confirmação de leitura
-            elif current_value is not None and current_value == 0 and last_value == 1:
-                logging.info(f"Mudança detectada no endereço {address_to_monitor}: valor voltou para 0 (inativo)")
-                
-                # Se não houve confirmação de leitura, escreve 1 no endereço de resultado
-                if not read_confirmed:
-                    write_modbus_register_silent(address_to_write, 1)
-                    logging.info(f"Nenhuma leitura confirmada enquanto o sensor estava ativo. Escrito 1 no endereço {address_to_write}.")
-                
-                # SEMPRE após o sensor desativar, reseta o endereço de confirmação de leitura para 0
-                reset_result = write_modbus_register_silent(address_read_confirmation, 0)
-                if reset_result:
-                    logging.info(f"Resetado endereço {address_read_confirmation} para 0 após sensor desativar.")
-                else:
-                    logging.error(f"Falha ao resetar endereço {address_read_confirmation} para 0.")
-            
-            # Atualiza o último valor lido
-            if current_value is not None:
-                last_value = current_value
-            
-            # Pausa de 200ms entre leituras para não sobrecarregar o CLP
-            time.sleep(0.2)
-            
-        except Exception as e:
-            logging.error(f"Erro durante o monitoramento Modbus: {e}")
-            time.sleep(1)  # Espera um pouco antes de tentar novamente
+
+    machine = SensorStateMachine(address_to_monitor, address_to_write, address_read_confirmation, stats)
+
+    def on_change(changes, values, detected_at):
+        machine.update(values, detected_at)
+
+    poller.subscribe(on_change, addresses=(address_to_monitor, address_read_confirmation))
+    # Se o poller já estava em execução, parte da imagem atual em vez de esperar a próxima mudança
+    machine.prime(poller.get_values())
+    poller.start()
+    try:
+        stop_event.wait()
+    finally:
+        poller.unsubscribe(on_change)
 
 def read_modbus_register_silent(address):
     """
@@ -252,20 +1172,13 @@ def read_modbus_register_silent(address):
     host, port, _, _, _, _ = load_modbus_config()
     
     try:
-        # Cria e configura o cliente Modbus TCP
-        client = ModbusClient(host=host, port=port, unit_id=1, auto_open=True)
-        
-        if not client.is_open:
-            if not client.open():
-                return None
-
-        # Tenta ler o registrador
-        value = client.read_holding_registers(address, 1)
-        client.close()
+        # Tenta ler o registrador através da conexão persistente
+        value = _client_pool.execute(host, port, "read_holding_registers", address, 1)
         
         if value is None:
             return None
         
+        _shadow_registers.observe({address: value[0]})
         return value[0]
     except Exception:
         return None
@@ -279,15 +1192,9 @@ def write_modbus_register_silent(address, value):
     host, port, _, _, _, _ = load_modbus_config()
     
     try:
-        # Cria e configura o cliente Modbus TCP
-        client = ModbusClient(host=host, port=port, unit_id=1, auto_open=True)
-        
-        if not client.is_open:
-            if not client.open():
-                return False
-
-        result = client.write_single_register(address, value)
-        client.close()
+        result = bool(_client_pool.execute(host, port, "write_single_register", address, value))
+        if result:
+            _shadow_registers.record(address, value)
         return result
     except Exception:
         return False
@@ -0,0 +1,163 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from queue import Full, Queue
+from typing import Any, Callable, Dict, List, Optional
+
+from latency_stats import window_summary
+
+
+class StageFull(Exception):
+    """
+    Job descartado porque a fila do estágio de destino (criado com reject_when_full) estava cheia.
+    """
+
+
+class PipelineStage:
+    """
+    Estágio do pipeline: fila limitada e um conjunto fixo de workers.
+    Quando a fila está cheia, quem entrega o job (o estágio anterior ou o chamador
+    de Pipeline.submit) fica bloqueado, propagando a contrapressão para trás. Com
+    reject_when_full, os jobs encaminhados por outros estágios são descartados (StageFull)
+    em vez de bloquear o estágio anterior.
+    """
+
+    def __init__(self, name: str, handler: Callable[[Dict[str, Any]], Optional[str]],
+                 workers: int = 1, maxsize: int = 32, window: int = 1000,
+                 reject_when_full: bool = False) -> None:
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.reject_when_full = reject_when_full
+        self.rejected = 0
+        self.queue: Queue = Queue(maxsize=maxsize)
+        self.lock = threading.Lock()
+        self.processed = 0
+        self.failed = 0
+        self.busy = 0
+        self.service_times = deque(maxlen=window)
+        self.wait_times = deque(maxlen=window)
+        self.threads: List[threading.Thread] = []
+
+    def record(self, waited: float, service: float, ok: bool) -> None:
+        with self.lock:
+            self.processed += 1
+            if not ok:
+                self.failed += 1
+            self.wait_times.append(waited)
+            self.service_times.append(service)
+
+    def summary(self) -> Dict[str, Any]:
+        with self.lock:
+            service = list(self.service_times)
+            wait = list(self.wait_times)
+            processed, failed, busy, rejected = self.processed, self.failed, self.busy, self.rejected
+
+        return {
+            "depth": self.queue.qsize(),
+            "capacity": self.queue.maxsize,
+            "workers": self.workers,
+            "busy": busy,
+            "processed": processed,
+            "failed": failed,
+            "rejected": rejected,
+            **window_summary("wait", wait),
+            **window_summary("service", service),
+        }
+
+
+class Pipeline:
+    """
+    Pipeline de estágios com filas limitadas.
+
+    Cada job é um dicionário. O handler de um estágio processa o job e retorna o nome do
+    próximo estágio (permitindo pular estágios, ex.: acertos de cache não passam pela consulta
+    às APIs) ou None quando o job termina. O Future retornado por submit() é concluído com o
+    job ao final, ou com a exceção lançada por um handler ou pelo encaminhamento (ex.: StageFull).
+    """
+
+    def __init__(self, name: str = "pipeline") -> None:
+        self.name = name
+        self.stages: Dict[str, PipelineStage] = {}
+        self.first_stage: Optional[str] = None
+
+    def add_stage(self, name: str, handler: Callable[[Dict[str, Any]], Optional[str]],
+                  workers: int = 1, maxsize: int = 32, reject_when_full: bool = False) -> None:
+        self.stages[name] = PipelineStage(name, handler, workers=workers, maxsize=maxsize,
+                                          reject_when_full=reject_when_full)
+        if self.first_stage is None:
+            self.first_stage = name
+
+    def start(self) -> None:
+        for stage in self.stages.values():
+            for index in range(stage.workers):
+                thread = threading.Thread(target=self._run, args=(stage,),
+                                          name=f"{self.name}-{stage.name}-{index}", daemon=True)
+                stage.threads.append(thread)
+                thread.start()
+
+    def submit(self, job: Dict[str, Any], stage: Optional[str] = None,
+               block: bool = True, timeout: Optional[float] = None) -> Future:
+        """
+        Entrega um job ao estágio indicado (por padrão, o primeiro). Bloqueia enquanto a fila
+        do estágio estiver cheia; com block=False ou timeout, lança queue.Full.
+        """
+        future: Future = Future()
+        self.stages[stage or self.first_stage].queue.put((job, future, time.perf_counter()),
+                                                         block=block, timeout=timeout)
+        return future
+
+    def _run(self, stage: PipelineStage) -> None:
+        while True:
+            job, future, enqueued_at = stage.queue.get()
+            started_at = time.perf_counter()
+            with stage.lock:
+                stage.busy += 1
+            next_stage = None
+            ok = True
+            try:
+                next_stage = stage.handler(job)
+            except Exception as ex:
+                ok = False
+                logging.error(f"Erro no estágio '{stage.name}' do pipeline: {ex}")
+                future.set_exception(ex)
+            finally:
+                with stage.lock:
+                    stage.busy -= 1
+                stage.record(started_at - enqueued_at, time.perf_counter() - started_at, ok)
+            if not ok:
+                continue
+            try:
+                if next_stage is None:
+                    future.set_result(job)
+                else:
+                    self._forward(job, future, next_stage)
+            except StageFull as ex:
+                logging.warning(f"Job descartado pelo pipeline: {ex}")
+                future.set_exception(ex)
+            except Exception as ex:
+                logging.error(f"Erro ao encaminhar job do estágio '{stage.name}' para '{next_stage}': {ex}")
+                future.set_exception(ex)
+
+    def _forward(self, job: Dict[str, Any], future: Future, next_stage: str) -> None:
+        target = self.stages.get(next_stage)
+        if target is None:
+            raise KeyError(f"estágio '{next_stage}' inexistente no pipeline {self.name}")
+        item = (job, future, time.perf_counter())
+        if not target.reject_when_full:
+            target.queue.put(item)
+            return
+        try:
+            target.queue.put_nowait(item)
+        except Full:
+            with target.lock:
+                target.rejected += 1
+            raise StageFull(f"fila do estágio '{target.name}' cheia") from None
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Retorna, por estágio, a profundidade da fila e as métricas de espera e de tempo de serviço.
+        """
+        return {name: stage.summary() for name, stage in self.stages.items()}
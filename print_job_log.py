@@ -0,0 +1,185 @@
+import os
+import json
+import logging
+import threading
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Set, Tuple
+
+# Estados possíveis de um job de impressão
+JOB_QUEUED = "queued"
+JOB_SENT = "sent"
+JOB_CONFIRMED = "confirmed"
+JOB_FAILED = "failed"
+
+PENDING_STATES = (JOB_QUEUED, JOB_SENT)
+
+# Quantidade de jobs concluídos (confirmados ou falhos) no arquivo que dispara a compactação
+DEFAULT_COMPACT_AFTER = 500
+
+# Etiquetas impressas por serial: a da primeira API (serial number) e a da workorder
+LABEL_API1 = "api1"
+LABEL_WORKORDER = "workorder"
+
+
+class PrintJobLog:
+    """
+    Log de escrita antecipada (write-ahead log) dos jobs de impressão.
+
+    Cada linha do arquivo é um registro JSON independente. O primeiro registro de um job
+    (estado 'queued') carrega o job completo; os registros seguintes carregam apenas
+    o id e o novo estado. Assim, cada transição é um único append + fsync, e a recuperação
+    é uma leitura sequencial do arquivo, sem reescritas.
+
+    Os jobs pendentes também são mantidos em memória; quando o arquivo acumula compact_after
+    jobs concluídos, ele é reescrito só com os pendentes, durante a execução, de modo que o
+    tamanho do log (e o tempo de recuperação) não cresce com o histórico da sessão.
+    """
+
+    def __init__(self, file_path: str, compact_after: int = DEFAULT_COMPACT_AFTER) -> None:
+        self.file_path = file_path
+        self.compact_after = max(1, compact_after)
+        self.lock = threading.Lock()
+        # Jobs ainda não concluídos, por id: {"job": ..., "state": ...} (na ordem de inserção)
+        self.pending: Dict[str, Dict[str, Any]] = {}
+        self.finished_in_file = 0
+
+    @staticmethod
+    def new_job_id() -> str:
+        return uuid.uuid4().hex
+
+    @staticmethod
+    def _entry_line(entry: Dict[str, Any]) -> str:
+        return json.dumps(entry, separators=(",", ":"), ensure_ascii=False) + "\n"
+
+    def _append(self, entry: Dict[str, Any]) -> None:
+        line = self._entry_line(entry)
+        with self.lock:
+            with open(self.file_path, mode="a", encoding="utf-8") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            job_id = entry["id"]
+            state = entry["state"]
+            if "job" in entry:
+                self.pending[job_id] = {"job": entry["job"], "state": state}
+            elif state in PENDING_STATES:
+                if job_id in self.pending:
+                    self.pending[job_id]["state"] = state
+            elif self.pending.pop(job_id, None) is not None:
+                self.finished_in_file += 1
+                if self.finished_in_file >= self.compact_after:
+                    self._rewrite_pending()
+
+    def record_queued(self, job: Dict[str, Any]) -> None:
+        """
+        Registra um job recém-enfileirado. O job deve possuir a chave 'id' e conter apenas o
+        necessário para reimprimir e registrar a etiqueta (o ZPL é gravado uma única vez).
+        """
+        try:
+            self._append({
+                "id": job["id"],
+                "state": JOB_QUEUED,
+                "ts": datetime.now().isoformat(),
+                "job": job
+            })
+        except Exception as ex:
+            logging.error(f"Erro ao registrar job {job.get('id')} no log de impressão: {ex}")
+
+    def record_state(self, job_id: str, state: str) -> None:
+        """
+        Registra a transição de estado de um job já existente no log.
+        """
+        try:
+            self._append({"id": job_id, "state": state, "ts": datetime.now().isoformat()})
+        except Exception as ex:
+            logging.error(f"Erro ao registrar estado '{state}' do job {job_id}: {ex}")
+
+    def _read_jobs(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Lê o log e retorna, por id, o job e seu último estado (na ordem de inserção).
+        Linhas corrompidas (ex.: escrita interrompida por queda de energia) são ignoradas.
+        """
+        jobs: Dict[str, Dict[str, Any]] = {}
+        if not os.path.isfile(self.file_path):
+            return jobs
+        with open(self.file_path, mode="r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                job_id = entry.get("id")
+                if not job_id:
+                    continue
+                if "job" in entry:
+                    jobs[job_id] = {"job": entry["job"], "state": entry.get("state", JOB_QUEUED)}
+                elif job_id in jobs:
+                    jobs[job_id]["state"] = entry.get("state", jobs[job_id]["state"])
+        return jobs
+
+    def recover_pending(self, printed_serials: Set[str]) -> List[Dict[str, Any]]:
+        """
+        Recupera os jobs não confirmados (estados 'queued' e 'sent') após um reinício.
+
+        - Jobs cujo serial já consta em printed_serials são descartados (a impressão foi
+          registrada, mas o log não chegou a ser atualizado);
+        - Para cada serial (e etiqueta), apenas o job pendente mais recente é mantido;
+        - O log é compactado, mantendo somente os jobs que voltam para a fila.
+
+        Retorna a lista de jobs a serem re-enfileirados, na ordem original.
+        """
+        try:
+            jobs = self._read_jobs()
+        except Exception as ex:
+            logging.error(f"Erro ao ler o log de jobs de impressão: {ex}")
+            return []
+
+        latest_by_serial: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        for entry in jobs.values():
+            if entry["state"] not in PENDING_STATES:
+                continue
+            job = entry["job"]
+            serial_number = job.get("serial_number", "")
+            if serial_number in printed_serials and not job.get("allow_duplicate", False):
+                continue
+            # Dicionários preservam a ordem de inserção: re-inserir move o job para o final
+            key = (serial_number, job.get("label", LABEL_WORKORDER))
+            latest_by_serial.pop(key, None)
+            latest_by_serial[key] = job
+
+        pending = list(latest_by_serial.values())
+        self._compact(pending)
+        if pending:
+            logging.info("Recuperados %d job(s) de impressão não confirmados do log.", len(pending))
+        return pending
+
+    def _compact(self, pending: List[Dict[str, Any]]) -> None:
+        """
+        Substitui o conteúdo do log pelos jobs pendentes recuperados.
+        """
+        with self.lock:
+            self.pending = {job["id"]: {"job": job, "state": JOB_QUEUED} for job in pending}
+            self._rewrite_pending()
+
+    def _rewrite_pending(self) -> None:
+        """
+        Reescreve o log de forma atômica contendo apenas os jobs pendentes em memória, cada um
+        com seu estado atual. Deve ser chamado com self.lock adquirido.
+        """
+        tmp_path = self.file_path + ".tmp"
+        try:
+            with open(tmp_path, mode="w", encoding="utf-8") as f:
+                for job_id, entry in self.pending.items():
+                    f.write(self._entry_line({
+                        "id": job_id,
+                        "state": entry["state"],
+                        "ts": datetime.now().isoformat(),
+                        "job": entry["job"]
+                    }))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.file_path)
+            self.finished_in_file = 0
+        except Exception as ex:
+            logging.error(f"Erro ao compactar o log de jobs de impressão: {ex}")
@@ -0,0 +1,54 @@
+import json
+import random
+import time
+
+import pytest
+
+from main import iter_json_array
+
+
+def _chunks(data: bytes, size: int):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+def test_large_record_in_small_chunks_is_linear():
+    # Registro de vários MB (ZPL com imagem embutida), com escapes, entre registros pequenos
+    image = "A" * (4 * 1024 * 1024)
+    records = [
+        {"SerialNo": "X-00001", "ZPL": "^XA^FDok^FS^XZ"},
+        {"SerialNo": "X-00002", "ZPL": "^XA^GFA," + image + "^XZ", "Note": "a \"quoted\" \\ path",
+         "Images": [image[:1024]]},
+        {"SerialNo": "X-00003", "ZPL": "^XA^XZ"},
+    ]
+    data = json.dumps(records).encode("utf-8")
+
+    started = time.perf_counter()
+    parsed = list(iter_json_array(_chunks(data, 1024)))
+    elapsed = time.perf_counter() - started
+
+    assert parsed == records
+    # Com a nova decodificação a cada bloco, ~4000 blocos de um registro de 4 MB levariam dezenas de segundos
+    assert elapsed < 2.0
+
+
+def test_random_splits_match_json_loads():
+    rng = random.Random(1234)
+    records = [
+        -15000000000.0, 0, 1e-7, True, False, None, "é ü ☃ \\\" [{", [],
+        {"a": [1, 2, {"b": "}]"}], "c": -0.5}, [[["x"]]], "",
+    ]
+    data = json.dumps(records, ensure_ascii=False).encode("utf-8")
+    for _ in range(300):
+        cuts = sorted(rng.sample(range(1, len(data)), rng.randint(1, 20)))
+        pieces = [data[a:b] for a, b in zip([0] + cuts, cuts + [len(data)])]
+        assert list(iter_json_array(pieces)) == records
+
+
+def test_truncated_and_invalid_input():
+    with pytest.raises(ValueError):
+        list(iter_json_array([b'[{"a": 1}, {"b"']))
+    with pytest.raises(ValueError):
+        list(iter_json_array([b'{"a": 1}']))
+    with pytest.raises(ValueError):
+        list(iter_json_array([b'[tru, 1]']))